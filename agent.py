@@ -0,0 +1,322 @@
+"""
+Headless collector agent.
+
+Collects the same metrics as the dashboard with the monitor collectors,
+batches them and pushes gzip-compressed batches to a central server's
+/api/ingest endpoint. Batches that cannot be delivered are spooled to disk
+and sent, oldest first, once the server is reachable again.
+
+Usage: python agent.py --server http://monitor.example:5000 [--interval 10]
+"""
+import os
+import json
+import gzip
+import time
+import queue
+import socket
+import logging
+import argparse
+import threading
+import requests
+import monitor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Default spool directory for undelivered batches
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'spool')
+
+# Collection and batching
+DEFAULT_INTERVAL = 10       # seconds between samples
+DEFAULT_BATCH_SIZE = 6      # samples per pushed batch
+DISK_INFO_INTERVAL = 600    # seconds between partition scans
+
+# Backpressure: batches waiting in memory before new ones go to the spool
+MAX_PENDING_BATCHES = 10
+
+# Spool size limit; the oldest batches are dropped beyond it
+SPOOL_MAX_BYTES = 50 * 1024 * 1024
+
+# Push timeouts and back-off
+PUSH_TIMEOUT = 10
+RETRY_BASE_DELAY = 2        # seconds, doubled after every failed push
+RETRY_MAX_DELAY = 300
+
+# push() result for a batch the server refused as too large; it is split
+# in two and both halves are resent
+BATCH_TOO_LARGE = -1
+
+
+class Spool:
+    """
+    FIFO of compressed batches stored as files, named by the batch's
+    creation time so that sorting the names gives the send order.
+    """
+
+    def __init__(self, directory=DEFAULT_SPOOL_DIR, max_bytes=SPOOL_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sequence = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.json.gz'))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._files())
+
+    def push(self, body, created=None):
+        """Store a batch, dropping the oldest ones if the spool is full."""
+        with self._lock:
+            self._sequence += 1
+            created = created if created is not None else time.time_ns()
+            name = f"{created:020d}-{self._sequence:06d}.json.gz"
+            tmp_file = os.path.join(self.directory, name + '.tmp')
+            with open(tmp_file, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_file, os.path.join(self.directory, name))
+            self._trim()
+
+    def _trim(self):
+        files = self._files()
+        sizes = {name: os.path.getsize(os.path.join(self.directory, name)) for name in files}
+        total = sum(sizes.values())
+        while files and total > self.max_bytes:
+            oldest = files.pop(0)
+            os.remove(os.path.join(self.directory, oldest))
+            total -= sizes[oldest]
+            logger.warning(f"Spool full; dropped batch {oldest}")
+
+    def peek(self):
+        """Return (name, body) of the oldest batch, or None."""
+        with self._lock:
+            files = self._files()
+            if not files:
+                return None
+            with open(os.path.join(self.directory, files[0]), 'rb') as f:
+                return files[0], f.read()
+
+    def remove(self, name):
+        with self._lock:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+class Agent:
+    """
+    Collects samples every `interval` seconds and pushes them in batches.
+    A sender thread delivers batches in order: spooled batches first, then
+    those waiting in memory. When the in-memory queue is full or the server
+    cannot be reached, batches go to the spool so collection never blocks.
+    The server can ask the agent to slow down with 429/503 and Retry-After.
+    """
+
+    def __init__(self, server, host=None, token=None, interval=DEFAULT_INTERVAL,
+                 batch_size=DEFAULT_BATCH_SIZE, max_pending=MAX_PENDING_BATCHES, spool=None):
+        self.url = server.rstrip('/') + '/api/ingest'
+        self.host = host or socket.gethostname()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.spool = spool if spool is not None else Spool()
+        self.session = requests.Session()
+        self.session.headers['Content-Type'] = 'application/json'
+        self.session.headers['Content-Encoding'] = 'gzip'
+        if token:
+            self.session.headers['Authorization'] = f'Bearer {token}'
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._submit_lock = threading.Lock()
+        self._batch = []
+        self._disk_info = []
+        self._disk_info_time = None
+        self._stopping = threading.Event()
+        self._sender = None
+
+    def collect(self):
+        """Take one sample; returns (timestamp, {series: value})."""
+        now = time.monotonic()
+        if self._disk_info_time is None or now - self._disk_info_time >= DISK_INFO_INTERVAL:
+            self._disk_info = monitor.get_disk_info()
+            self._disk_info_time = now
+        snapshot = monitor.Snapshot.collect(process_count=0)
+        return snapshot.timestamp.timestamp(), snapshot.samples(self._disk_info)
+
+    def add_sample(self, timestamp, samples):
+        """Add a sample to the current batch, submitting it once full."""
+        self._batch.append([timestamp, samples])
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Submit the current batch, even if it is not full."""
+        if not self._batch:
+            return
+        body = gzip.compress(json.dumps({'host': self.host, 'samples': self._batch}).encode('utf-8'))
+        self._batch = []
+        self.submit((time.time_ns(), body))
+
+    def submit(self, batch):
+        """Queue a (created, body) batch for sending, spilling to the spool when backed up."""
+        with self._submit_lock:
+            # Once anything is spooled, newer batches must queue behind it
+            if len(self.spool) == 0:
+                try:
+                    self._pending.put_nowait(batch)
+                    return
+                except queue.Full:
+                    logger.warning("Server is falling behind; spooling batches to disk")
+            self._spill()
+            self.spool.push(batch[1], batch[0])
+
+    def _spill(self):
+        """Move batches waiting in memory to the spool, keeping their order."""
+        while True:
+            try:
+                created, body = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            self.spool.push(body, created)
+
+    def push(self, body):
+        """
+        POST one batch. Returns 0 when done with the batch, the seconds the
+        server asked us to wait, BATCH_TOO_LARGE, or None to back off
+        exponentially. Only a malformed batch (400) is dropped; anything else
+        the server refuses is kept and retried.
+        """
+        try:
+            response = self.session.post(self.url, data=body, timeout=PUSH_TIMEOUT)
+        except requests.RequestException as e:
+            logger.warning(f"Push to {self.url} failed: {str(e)}")
+            return None
+        status = response.status_code
+        if status in (429, 503):
+            try:
+                return max(float(response.headers.get('Retry-After', RETRY_BASE_DELAY)), 0.1)
+            except ValueError:
+                return RETRY_BASE_DELAY
+        if status == 413:
+            return BATCH_TOO_LARGE
+        if status == 400:
+            # Retrying will not help; drop the batch
+            logger.warning(f"Server rejected batch as invalid, dropping it: {response.text[:200]}")
+            return 0
+        if status in (401, 403, 404):
+            logger.error(f"Server refused batch ({status}); check --server and --token. "
+                         f"Batches are kept in the spool until it accepts them")
+            return None
+        if status >= 400:
+            logger.warning(f"Server returned {status} while pushing batch")
+            return None
+        return 0
+
+    def _split(self, body):
+        """Split a batch into two halves of its samples, or None for a single sample."""
+        batch = json.loads(gzip.decompress(body))
+        samples = batch['samples']
+        if len(samples) < 2:
+            return None
+        middle = len(samples) // 2
+        return [gzip.compress(json.dumps(dict(batch, samples=part)).encode('utf-8'))
+                for part in (samples[:middle], samples[middle:])]
+
+    def _send_loop(self):
+        delay = RETRY_BASE_DELAY
+        while not self._stopping.is_set():
+            spooled = self.spool.peek()
+            if spooled is not None:
+                name, body = spooled
+                created = int(name.split('-', 1)[0])
+            else:
+                try:
+                    created, body = self._pending.get(timeout=1)
+                except queue.Empty:
+                    continue
+                name = None
+
+            wait = self.push(body)
+            if wait == BATCH_TOO_LARGE:
+                halves = self._split(body)
+                if halves is None:
+                    logger.warning("Server refused a single sample as too large; dropping it")
+                else:
+                    # The halves take the batch's place at the head of the spool
+                    with self._submit_lock:
+                        for half in halves:
+                            self.spool.push(half, created)
+                        self._spill()
+                if name is not None:
+                    self.spool.remove(name)
+                continue
+            if wait == 0:
+                if name is not None:
+                    self.spool.remove(name)
+                delay = RETRY_BASE_DELAY
+                continue
+
+            # Not delivered: keep it (and everything behind it) in the spool
+            if name is None:
+                with self._submit_lock:
+                    self.spool.push(body, created)
+                    self._spill()
+            if wait is None:
+                wait = delay
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+            self._stopping.wait(wait)
+
+    def start(self):
+        """Start the sender thread."""
+        if self._sender is None:
+            self._sender = threading.Thread(target=self._send_loop, name='agent-sender', daemon=True)
+            self._sender.start()
+
+    def stop(self, timeout=5):
+        """Stop sending; unsent batches are left in the spool for the next run."""
+        self.flush()
+        self._stopping.set()
+        if self._sender is not None:
+            self._sender.join(timeout)
+            self._sender = None
+        with self._submit_lock:
+            self._spill()
+
+    def run(self):
+        """Collect and push until interrupted."""
+        self.start()
+        next_run = time.monotonic()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    self.add_sample(*self.collect())
+                except Exception:
+                    logger.exception("Error collecting metrics")
+                next_run += self.interval
+                self._stopping.wait(max(next_run - time.monotonic(), 0))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Push PC health metrics to a central server.")
+    parser.add_argument('--server', required=True, help="Base URL of the server, e.g. http://monitor:5000")
+    parser.add_argument('--host', default=None, help="Host name to report (default: this machine's hostname)")
+    parser.add_argument('--token', default=os.environ.get('INGEST_TOKEN'), help="Ingest token (default: $INGEST_TOKEN)")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help="Seconds between samples")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Samples per batch")
+    parser.add_argument('--spool-dir', default=DEFAULT_SPOOL_DIR, help="Directory for undelivered batches")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    agent = Agent(args.server, host=args.host, token=args.token, interval=args.interval,
+                  batch_size=args.batch_size, spool=Spool(args.spool_dir))
+    logger.info(f"Pushing metrics for {agent.host} to {agent.url} every {args.interval}s")
+    agent.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,84 +1,160 @@
 import os
 import json
+import queue
+import random
 import logging
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
+import perf
+from config import get_settings, save_settings
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Configuration file paths
 CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
-EMAIL_CONFIG_FILE = os.path.join(CONFIG_DIR, 'email_config.json')
-DISCORD_CONFIG_FILE = os.path.join(CONFIG_DIR, 'discord_config.json')
+DEAD_LETTER_FILE = os.path.join(CONFIG_DIR, 'alert_dead_letter.log')
 
 # Ensure config directory exists
 os.makedirs(CONFIG_DIR, exist_ok=True)
 
+# Per-channel network timeouts (seconds)
+SMTP_TIMEOUT = 15
+WEBHOOK_TIMEOUT = 10
+
+# Pooled alert connections
+SMTP_IDLE_TIMEOUT = 300  # close the SMTP connection after this many idle seconds
+WEBHOOK_POOL_SIZE = 4
+
+# Alert dispatch queue
+ALERT_QUEUE_SIZE = 100
+ALERT_WORKERS = 2
+ALERT_MAX_ATTEMPTS = 4
+ALERT_RETRY_BASE_DELAY = 2  # seconds, doubled after every failed attempt
+
+# Digest mode: alerts for one channel within this many seconds are sent as a
+# single message (0 sends every alert on its own)
+ALERT_DIGEST_WINDOW = 0
+DIGEST_MAX_ITEMS = 20  # alerts listed in full in one digest message
+
 def get_email_config():
-    """Get email configuration from file."""
-    try:
-        if os.path.exists(EMAIL_CONFIG_FILE):
-            with open(EMAIL_CONFIG_FILE, 'r') as f:
-                return json.load(f)
-        else:
-            # Return default empty config
-            return {
-                'email_from': '',
-                'email_to': '',
-                'smtp_server': 'smtp.gmail.com',
-                'smtp_port': 587,
-                'smtp_username': '',
-                'smtp_password': ''
-            }
-    except Exception as e:
-        logger.exception("Error loading email configuration")
-        return {
-            'email_from': '',
-            'email_to': '',
-            'smtp_server': 'smtp.gmail.com',
-            'smtp_port': 587,
-            'smtp_username': '',
-            'smtp_password': ''
-        }
+    """Get email configuration (cached, reloaded when the file changes)."""
+    return get_settings('email')
 
 def save_email_config(config):
     """Save email configuration to file."""
-    try:
-        with open(EMAIL_CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=4)
-        return True
-    except Exception as e:
-        logger.exception("Error saving email configuration")
-        return False
+    return save_settings('email', config)
 
 def get_discord_config():
-    """Get Discord webhook configuration from file."""
-    try:
-        if os.path.exists(DISCORD_CONFIG_FILE):
-            with open(DISCORD_CONFIG_FILE, 'r') as f:
-                return json.load(f)
-        else:
-            # Return default empty config
-            return {'webhook_url': ''}
-    except Exception as e:
-        logger.exception("Error loading Discord configuration")
-        return {'webhook_url': ''}
+    """Get Discord webhook configuration (cached, reloaded when the file changes)."""
+    return get_settings('discord')
 
 def save_discord_config(config):
     """Save Discord webhook configuration to file."""
-    try:
-        with open(DISCORD_CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=4)
-        return True
-    except Exception as e:
-        logger.exception("Error saving Discord configuration")
-        return False
+    return save_settings('discord', config)
+
+class SMTPChannel:
+    """
+    Keeps one authenticated SMTP connection open across alerts.
+    Before reuse the connection is health-checked with NOOP; it is
+    re-established (connect, STARTTLS, login) when it was dropped, sat idle
+    for longer than idle_timeout or the SMTP settings changed.
+    """
+
+    def __init__(self, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._settings = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self, config, timeout):
+        server = smtplib.SMTP(config.get('smtp_server'), config.get('smtp_port'), timeout=timeout)
+        try:
+            if config.get('smtp_starttls', True):
+                server.starttls()
+            if config.get('smtp_username'):
+                server.login(config.get('smtp_username'), config.get('smtp_password'))
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _healthy(self):
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            self._server.close()
+        self._server = None
+
+    def send(self, msg, config, timeout=SMTP_TIMEOUT):
+        """Send a message, reconnecting once if the pooled connection fails."""
+        settings = tuple(config.get(key) for key in
+                         ('smtp_server', 'smtp_port', 'smtp_username', 'smtp_password', 'smtp_starttls'))
+        with self._lock:
+            if self._server is not None and (settings != self._settings
+                                             or time.monotonic() - self._last_used > self.idle_timeout
+                                             or not self._healthy()):
+                self._close()
+            for attempt in range(2):
+                if self._server is None:
+                    self._server = self._connect(config, timeout)
+                    self._settings = settings
+                try:
+                    self._server.send_message(msg)
+                    self._last_used = time.monotonic()
+                    return
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    # Dropped between the health check and the send
+                    self._server.close()
+                    self._server = None
+                    if attempt:
+                        raise
+
+    def close(self):
+        with self._lock:
+            self._close()
+
 
-def send_email_alert(subject, message, config=None):
+class WebhookChannel:
+    """Pooled keep-alive HTTP session for webhook alerts."""
+
+    def __init__(self, pool_size=WEBHOOK_POOL_SIZE):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def post(self, url, payload, timeout=WEBHOOK_TIMEOUT):
+        return self.session.post(url, json=payload, timeout=timeout)
+
+    def close(self):
+        self.session.close()
+
+email_channel = SMTPChannel()
+webhook_channel = WebhookChannel()
+
+def close_channels():
+    """Close pooled alert connections."""
+    email_channel.close()
+    webhook_channel.close()
+
+def send_email_alert(subject, message, config=None, timeout=SMTP_TIMEOUT):
     """Send an email alert."""
     if config is None:
         config = get_email_config()
@@ -90,7 +166,8 @@ def send_email_alert(subject, message, config=None):
     smtp_username = config.get('smtp_username')
     smtp_password = config.get('smtp_password')
     
-    if not all([email_from, email_to, smtp_server, smtp_port, smtp_username, smtp_password]):
+    # Credentials may be left empty for a relay that does not require login
+    if not all([email_from, email_to, smtp_server, smtp_port]) or (smtp_username and not smtp_password):
         logger.error("Incomplete email configuration")
         return False
     
@@ -105,14 +182,8 @@ def send_email_alert(subject, message, config=None):
         full_message = f"{message}\n\nTimestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         msg.attach(MIMEText(full_message, 'plain'))
         
-        # Connect to SMTP server
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_username, smtp_password)
-        
-        # Send email
-        server.send_message(msg)
-        server.quit()
+        # Send over the pooled SMTP connection
+        email_channel.send(msg, config, timeout)
         
         logger.info(f"Email alert sent: {subject}")
         return True
@@ -120,7 +191,7 @@ def send_email_alert(subject, message, config=None):
         logger.exception(f"Error sending email alert: {str(e)}")
         return False
 
-def send_discord_alert(title, message, config=None):
+def send_discord_alert(title, message, config=None, timeout=WEBHOOK_TIMEOUT):
     """Send a Discord alert via webhook."""
     if config is None:
         config = get_discord_config()
@@ -145,12 +216,8 @@ def send_discord_alert(title, message, config=None):
             }]
         }
         
-        # Send request to webhook
-        response = requests.post(
-            webhook_url, 
-            json=payload,
-            headers={"Content-Type": "application/json"}
-        )
+        # Send request to webhook over the pooled session
+        response = webhook_channel.post(webhook_url, payload, timeout)
         
         if response.status_code == 204:
             logger.info(f"Discord alert sent: {title}")
@@ -161,3 +228,175 @@ def send_discord_alert(title, message, config=None):
     except Exception as e:
         logger.exception(f"Error sending Discord alert: {str(e)}")
         return False
+
+class AlertDispatcher:
+    """
+    Bounded alert queue drained by background worker threads.
+    Callers only enqueue; workers deliver each alert with its channel's
+    timeout, retry failures with exponential backoff, and append alerts that
+    still fail (or do not fit in the queue) to a dead-letter log.
+    With a digest_window, alerts for the same channel are held for that many
+    seconds after the first one and then delivered as one digest message.
+    """
+
+    def __init__(self, senders, queue_size=ALERT_QUEUE_SIZE, workers=ALERT_WORKERS,
+                 max_attempts=ALERT_MAX_ATTEMPTS, retry_base_delay=ALERT_RETRY_BASE_DELAY,
+                 dead_letter_file=DEAD_LETTER_FILE, digest_window=ALERT_DIGEST_WINDOW):
+        self.senders = senders
+        self.digest_window = digest_window
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.dead_letter_file = dead_letter_file
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._digests = {}  # channel -> {'items': [(title, message)], 'config': ...}
+        self._digest_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads (no-op if already running)."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"alert-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """Stop the workers after the alerts already queued are attempted once."""
+        # Send whatever is waiting for a digest window before shutting down
+        self.flush_digests()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stopping.set()
+        for _ in threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for thread in threads:
+            thread.join(timeout)
+
+    def enqueue(self, channel, title, message, config):
+        """Queue an alert for delivery; returns False if it had to be dropped."""
+        if channel not in self.senders:
+            raise ValueError(f"Unknown alert channel: {channel}")
+        self.start()
+        if self.digest_window and self.digest_window > 0:
+            with self._digest_lock:
+                digest = self._digests.get(channel)
+                if digest is None:
+                    digest = self._digests[channel] = {'items': [], 'config': config}
+                    timer = threading.Timer(self.digest_window, self._flush_digest, args=(channel,))
+                    timer.daemon = True
+                    timer.start()
+                digest['items'].append((title, message))
+                digest['config'] = config
+            return True
+        return self._put(channel, title, message, config)
+
+    def flush_digests(self):
+        """Queue all pending digests now instead of waiting for their window."""
+        with self._digest_lock:
+            channels = list(self._digests)
+        for channel in channels:
+            self._flush_digest(channel)
+
+    def _flush_digest(self, channel):
+        with self._digest_lock:
+            digest = self._digests.pop(channel, None)
+        if not digest:
+            return
+        title, message = format_digest(digest['items'])
+        self._put(channel, title, message, digest['config'])
+
+    def _put(self, channel, title, message, config):
+        job = {'channel': channel, 'title': title, 'message': message, 'config': config, 'attempts': 0}
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            self._dead_letter(job, "alert queue full")
+            return False
+
+    def pending(self):
+        """Approximate number of queued alerts (including those held for a digest)."""
+        with self._digest_lock:
+            held = sum(len(digest['items']) for digest in self._digests.values())
+        return self._queue.qsize() + held
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._deliver(job)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, job):
+        job['attempts'] += 1
+        error = None
+        try:
+            with perf.timed(f"alert.{job['channel']}"):
+                delivered = self.senders[job['channel']](job['title'], job['message'], job['config'])
+            if delivered:
+                return
+            error = "sender reported failure"
+        except Exception as e:
+            error = str(e)
+
+        if job['attempts'] >= self.max_attempts or self._stopping.is_set():
+            self._dead_letter(job, error)
+            return
+
+        # Back off exponentially (with jitter) before the next attempt
+        delay = self.retry_base_delay * 2 ** (job['attempts'] - 1) * random.uniform(0.8, 1.2)
+        logger.warning(f"{job['channel'].capitalize()} alert failed ({error}); retrying in {delay:.1f}s")
+        timer = threading.Timer(delay, self._retry, args=(job,))
+        timer.daemon = True
+        timer.start()
+
+    def _retry(self, job):
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._dead_letter(job, "alert queue full")
+
+    def _dead_letter(self, job, error):
+        """Record an undeliverable alert."""
+        logger.error(f"Giving up on {job['channel']} alert '{job['title']}' after {job['attempts']} attempt(s): {error}")
+        entry = {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'channel': job['channel'],
+            'title': job['title'],
+            'message': job['message'],
+            'attempts': job['attempts'],
+            'error': error
+        }
+        try:
+            with self._lock:
+                with open(self.dead_letter_file, 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+        except Exception:
+            logger.exception("Error writing alert dead-letter log")
+
+def format_digest(items, max_items=DIGEST_MAX_ITEMS):
+    """Combine (title, message) pairs into a single (title, message)."""
+    if len(items) == 1:
+        return items[0]
+    title = f"PC Health Check: {len(items)} alerts"
+    sections = [f"{item_title}\n{item_message}" for item_title, item_message in items[:max_items]]
+    if len(items) > max_items:
+        sections.append(f"... and {len(items) - max_items} more alert(s)")
+    return title, "\n\n".join(sections)
+
+dispatcher = AlertDispatcher({
+    'email': send_email_alert,
+    'discord': send_discord_alert
+})
@@ -0,0 +1,138 @@
+import time
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rule states
+OK = 'ok'
+PENDING = 'pending'
+FIRING = 'firing'
+
+# Notification events returned by AlertRule.evaluate()
+EVENT_FIRING = 'firing'
+EVENT_RENOTIFY = 'renotify'
+EVENT_RESOLVED = 'resolved'
+
+
+class AlertRule:
+    """
+    Threshold alert with hysteresis, a pending period and re-notification.
+    OK -> PENDING when the value rises above threshold; PENDING -> FIRING once
+    it stayed above for for_seconds (back to OK if it drops first); FIRING ->
+    resolved (OK) once it falls to clear_threshold or below. While firing, the
+    alert is repeated every renotify_interval seconds (0 disables).
+    """
+
+    def __init__(self, name, label, threshold, clear_threshold=None, for_seconds=0,
+                 renotify_interval=0, notify_resolved=True, unit='%'):
+        self.name = name
+        self.label = label
+        self.unit = unit
+        self.configure(threshold, clear_threshold, for_seconds, renotify_interval, notify_resolved)
+        self.reset()
+
+    def configure(self, threshold, clear_threshold=None, for_seconds=0, renotify_interval=0, notify_resolved=True):
+        """Update the rule's settings without losing its state."""
+        self.threshold = float(threshold)
+        self.clear_threshold = self.threshold if clear_threshold is None else min(float(clear_threshold), self.threshold)
+        self.for_seconds = float(for_seconds)
+        self.renotify_interval = float(renotify_interval)
+        self.notify_resolved = bool(notify_resolved)
+
+    def reset(self):
+        """Return to OK without notifying."""
+        self.state = OK
+        self.value = None
+        self.since = None
+        self.last_notified = None
+
+    def evaluate(self, value, now=None):
+        """
+        Feed the latest value. Returns EVENT_FIRING, EVENT_RENOTIFY or
+        EVENT_RESOLVED when a notification is due, otherwise None.
+        """
+        self.value = value
+        return self.transition(value > self.threshold, value <= self.clear_threshold, now)
+
+    def transition(self, breached, cleared, now=None):
+        """
+        Advance the state machine given whether the alert condition holds
+        (breached) and whether a firing alert may resolve (cleared).
+        """
+        if now is None:
+            now = time.time()
+
+        if self.state == OK:
+            if not breached:
+                return None
+            self.state = PENDING
+            self.since = now
+
+        if self.state == PENDING:
+            if not breached:
+                self.state = OK
+                self.since = None
+                return None
+            if now - self.since < self.for_seconds:
+                return None
+            self.state = FIRING
+            self.last_notified = now
+            return EVENT_FIRING
+
+        # FIRING
+        if cleared:
+            value = self.value
+            self.reset()
+            self.value = value
+            return EVENT_RESOLVED if self.notify_resolved else None
+        if self.renotify_interval and now - self.last_notified >= self.renotify_interval:
+            self.last_notified = now
+            return EVENT_RENOTIFY
+        return None
+
+    def notification(self, event):
+        """Return (title, message) for an event returned by evaluate()."""
+        value = f"{self.value}{self.unit}"
+        if event == EVENT_RESOLVED:
+            return (f"{self.label} Usage Resolved",
+                    f"{self.label} usage is back to normal: {value} (clear threshold: {self.clear_threshold}{self.unit})")
+        title = f"High {self.label} Usage"
+        message = f"{self.label} usage is high: {value} (threshold: {self.threshold}{self.unit})"
+        if event == EVENT_RENOTIFY:
+            minutes = int((self.last_notified - self.since) // 60)
+            title += " (still firing)"
+            message += f", firing for {minutes} minutes"
+        return title, message
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'value': self.value,
+            'threshold': self.threshold,
+            'clear_threshold': self.clear_threshold,
+            'since': self.since,
+            'last_notified': self.last_notified
+        }
+
+
+def build_threshold_rules(settings, rules=None):
+    """
+    Create or reconfigure the cpu, memory and disk rules from alert settings.
+    Existing rules keep their state.
+    """
+    rules = rules if rules is not None else {}
+    for name, label in (('cpu', 'CPU'), ('memory', 'Memory'), ('disk', 'Disk')):
+        options = (
+            settings[f'{name}_threshold'],
+            settings.get(f'{name}_clear_threshold'),
+            settings.get('alert_for_seconds', 0),
+            settings.get('alert_renotify_interval', 0),
+            settings.get('alert_notify_resolved', True)
+        )
+        if name in rules:
+            rules[name].configure(*options)
+        else:
+            rules[name] = AlertRule(name, label, *options)
+    return rules
@@ -1,10 +1,28 @@
 import os
+import re
+import sys
+import math
+import socket
+import gzip
+import zlib
+import time
 import logging
+import threading
+import uuid
+from array import array
 from flask import Flask, render_template, request, jsonify, session
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit
 from apscheduler.schedulers.background import BackgroundScheduler
 import monitor
+import history
+import delta
 import alert
+import alert_rules
+import rule_engine
+import collectors
+import fleet
+import exposition
+import perf
 import config
 import json
 from datetime import datetime, timedelta
@@ -22,29 +40,95 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 
 # Initialize the scheduler
 scheduler = BackgroundScheduler()
+METRICS_JOB_ID = 'update_system_metrics'
 
 # Initialize data storage for historical data (24 hours of data points)
 HISTORY_POINTS = 1440  # 24 hours with 1-minute intervals
-historical_data = {
-    'cpu': [],
-    'memory': [],
-    'disk': [],
-    'network': {'sent': [], 'received': []},
-    'timestamps': []
-}
-
-# Initialize alert settings with defaults
-alert_settings = config.get_default_alert_settings()
-
-# Disk information cache
-disk_info = []
-
-# Cache/Temp files information
-cache_info = {
+HISTORY_DIR = os.environ.get("HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'history'))
+HISTORY_RETENTION_DAYS = int(os.environ.get("HISTORY_RETENTION_DAYS", 30))
+metric_history = history.HistoryStore(capacity=HISTORY_POINTS,
+                                      persist_dir=HISTORY_DIR,
+                                      retention_days=HISTORY_RETENTION_DAYS)
+
+# Number of points sent to the dashboard charts
+CHART_POINTS = 60
+
+# Metrics pushed by agents (see agent.py), kept in memory per host
+INGEST_TOKEN = os.environ.get("INGEST_TOKEN")  # required as a bearer token when set
+MAX_INGEST_BYTES = 4 * 1024 * 1024             # per batch, after decompression
+MAX_CONCURRENT_INGESTS = 4                     # further pushes get 429 with Retry-After
+INGEST_RETRY_AFTER = 5
+MAX_CLOCK_SKEW = 300                           # seconds a sample may be ahead of our clock
+HOST_NAME_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,253}$')
+# Series names as monitor.Snapshot.samples() builds them: dotted words, each
+# optionally labelled, e.g. cpu, cpu.core[3], net[eth0].bytes_recv, disk[/].percent
+SERIES_NAME_PATTERN = re.compile(r'^(?=.{1,256}$)[A-Za-z_]\w*(?:\[[^\[\]\x00-\x1f]{1,128}\])?'
+                                 r'(?:\.[A-Za-z_]\w*(?:\[[^\[\]\x00-\x1f]{1,128}\])?)*$')
+MAX_SERIES_PER_HOST = int(os.environ.get("MAX_SERIES_PER_HOST", 500))  # batches adding more get 413
+# Remote hosts keep a shorter history than this one: 1 hour of raw samples
+# (at the agent's 10s interval), 5 minute buckets for a day and hourly
+# buckets for a week
+REMOTE_HISTORY_POINTS = 360
+REMOTE_HISTORY_TIERS = ((300, 288), (3600, 7 * 24))
+MAX_REMOTE_HOSTS = int(os.environ.get("MAX_REMOTE_HOSTS", 256))
+REMOTE_HOST_TTL = 24 * 3600                    # silent hosts are forgotten after this long
+REMOTE_HOSTS_FULL_RETRY_AFTER = 300
+remote_hosts = {}  # host -> {'history', 'last_timestamp', 'last_seen', 'lock'}
+remote_hosts_lock = threading.Lock()
+ingest_slots = threading.BoundedSemaphore(MAX_CONCURRENT_INGESTS)
+
+class IngestRefused(Exception):
+    """A batch refused as a whole, with the HTTP status (and Retry-After) to answer with."""
+
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+# Latest values and windowed aggregates of every host, this one included
+LOCAL_HOST = socket.gethostname()
+fleet_index = fleet.FleetIndex()
+
+# Alert settings saved in config/ (defaults for anything not saved yet)
+alert_settings = config.load_alert_settings()
+
+# Threshold alert state machines, keyed by metric
+alert_rule_states = alert_rules.build_threshold_rules(alert_settings)
+
+# User-defined expression rules, evaluated against the metric history
+expression_rules = rule_engine.RuleEngine(metric_history)
+expression_rules.configure(alert_settings['alert_rules'], alert_settings)
+
+# Slow collectors (partition list, cache scan) run as their own jobs on a
+# separate executor; the metrics tick only reads their latest results
+slow_collectors = collectors.CollectorScheduler(scheduler)
+# Partitions are rescanned every 5 minutes (10 metrics ticks)
+slow_collectors.register('disk_info', monitor.get_disk_info, interval=300, budget=5, default=[])
+slow_collectors.register('cache_info', monitor.get_cache_info, interval=600, budget=30, default={
     'total_size': 0,
     'file_count': 0,
     'paths': {}
-}
+})
+
+# Background cache cleanup jobs by ID
+MAX_CLEANUP_JOBS = 20
+cleanup_jobs = {}
+cleanup_jobs_lock = threading.Lock()
+
+# Turns each tick's payload into a delta for connected clients
+payload_encoder = delta.DeltaEncoder()
+
+# /metrics output, rendered once per tick
+metrics_exposition = exposition.MetricsExposition()
+
+# A client connecting when the latest payload is older than this many
+# seconds triggers one early collection (0 disables)
+SNAPSHOT_MAX_AGE = int(os.environ.get("SNAPSHOT_MAX_AGE", 120))
+
+# Clients that connected before any payload existed
+waiting_clients = set()
+refresh_lock = threading.Lock()
+refresh_requested = False
 
 # System logs cache
 system_logs = []
@@ -71,25 +155,36 @@ def settings():
 def update_settings():
     """Update alert settings."""
     data = request.json
-    global alert_settings
     
     try:
-        # Update alert thresholds
-        if 'cpu_threshold' in data:
-            alert_settings['cpu_threshold'] = float(data['cpu_threshold'])
-        if 'memory_threshold' in data:
-            alert_settings['memory_threshold'] = float(data['memory_threshold'])
-        if 'disk_threshold' in data:
-            alert_settings['disk_threshold'] = float(data['disk_threshold'])
+        settings = dict(alert_settings)
+        
+        # Update alert thresholds and timing
+        for key in ('cpu_threshold', 'memory_threshold', 'disk_threshold',
+                    'cpu_clear_threshold', 'memory_clear_threshold', 'disk_clear_threshold',
+                    'alert_for_seconds', 'alert_renotify_interval', 'alert_digest_window'):
+            if key in data:
+                settings[key] = float(data[key])
             
         # Update alert methods
         if 'alerts_enabled' in data:
-            alert_settings['alerts_enabled'] = data['alerts_enabled']
+            settings['alerts_enabled'] = data['alerts_enabled']
+        if 'alert_notify_resolved' in data:
+            settings['alert_notify_resolved'] = data['alert_notify_resolved']
         if 'email_alerts' in data:
-            alert_settings['email_alerts'] = data['email_alerts']
+            settings['email_alerts'] = data['email_alerts']
         if 'discord_alerts' in data:
-            alert_settings['discord_alerts'] = data['discord_alerts']
-            
+            settings['discord_alerts'] = data['discord_alerts']
+        
+        # Update expression rules, rejecting any that do not compile
+        if 'alert_rules' in data:
+            for definition in data['alert_rules']:
+                try:
+                    expression_rules.compile(definition.get('name', ''), definition.get('expr', ''))
+                except ValueError as e:
+                    return jsonify({'status': 'error', 'message': str(e)}), 400
+            settings['alert_rules'] = data['alert_rules']
+        
         # Update email configuration
         if 'email_config' in data:
             alert.save_email_config(data['email_config'])
@@ -98,8 +193,9 @@ def update_settings():
         if 'discord_webhook' in data:
             alert.save_discord_config({'webhook_url': data['discord_webhook']})
             
-        # Save settings to file
-        config.save_alert_settings(alert_settings)
+        # Save settings to file and apply them
+        config.save_alert_settings(settings)
+        apply_alert_settings(config.load_alert_settings())
         
         return jsonify({'status': 'success', 'message': 'Settings updated successfully'})
     except Exception as e:
@@ -149,63 +245,351 @@ def test_alert():
 
 @app.route('/api/clean_cache', methods=['POST'])
 def clean_cache():
-    """Clean cache and temporary files."""
-    data = request.json
+    """Start a background job that cleans cache and temporary files."""
+    data = request.json or {}
     paths = data.get('paths', None)  # If None, clean all cache paths
     
     try:
-        # Update cache info before cleaning
-        global cache_info
-        cache_info = monitor.get_cache_info()
-        
-        # Get total size before cleaning for reporting
-        total_size_before = cache_info['total_size']
-        file_count_before = cache_info['file_count']
+        with cleanup_jobs_lock:
+            running = [job for job in cleanup_jobs.values() if job['status'] == 'running']
+            if running:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'A cache cleanup is already running',
+                    'job_id': running[0]['id']
+                }), 409
+            
+            job_id = uuid.uuid4().hex
+            cleanup_jobs[job_id] = {
+                'id': job_id,
+                'status': 'running',
+                'paths': paths,
+                'progress': {'bytes_freed': 0, 'files_removed': 0, 'current_path': None},
+                'result': None,
+                'message': None
+            }
+            
+            # Forget the oldest finished jobs
+            while len(cleanup_jobs) > MAX_CLEANUP_JOBS:
+                del cleanup_jobs[next(iter(cleanup_jobs))]
         
-        # Clean the cache
-        result = monitor.clean_cache_files(paths)
+        socketio.start_background_task(run_cleanup_job, job_id, paths)
         
-        # Update cache info after cleaning
-        cache_info = monitor.get_cache_info()
+        return jsonify({
+            'status': 'started',
+            'message': 'Cache cleanup started',
+            'job_id': job_id
+        }), 202
         
-        # Calculate space freed
-        space_freed = total_size_before - cache_info['total_size']
-        files_removed = file_count_before - cache_info['file_count']
+    except Exception as e:
+        logger.exception("Error starting cache cleanup")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/clean_cache/<job_id>')
+def clean_cache_status(job_id):
+    """Get the status of a cache cleanup job."""
+    job = cleanup_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown cleanup job'}), 404
+    return jsonify(job)
+
+def run_cleanup_job(job_id, paths):
+    """Run a cache cleanup and stream its progress over SocketIO."""
+    job = cleanup_jobs[job_id]
+    
+    def report_progress(progress):
+        job['progress'] = progress
+        with perf.timed('emit.cache_cleanup_progress'):
+            socketio.emit('cache_cleanup_progress', dict(progress, job_id=job_id))
+    
+    try:
+        result = monitor.clean_cache_files(paths, progress=report_progress)
         
-        return jsonify({
-            'status': 'success',
-            'message': f'Successfully cleaned {files_removed} files and freed {space_freed / (1024 * 1024):.2f} MB of space',
-            'details': result,
-            'space_freed': space_freed,
-            'files_removed': files_removed
-        })
+        # Refresh cache info; only the cleaned directories are re-listed
+        cache_info = slow_collectors.run_now('cache_info')
         
+        job['result'] = result
+        job['message'] = (f"Successfully cleaned {result['files_removed']} files and freed "
+                          f"{result['total_cleaned'] / (1024 * 1024):.2f} MB of space")
+        job['status'] = 'completed'
     except Exception as e:
         logger.exception("Error cleaning cache files")
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        job['message'] = str(e)
+        job['status'] = 'failed'
+    
+    with perf.timed('emit.cache_cleanup_complete'):
+        socketio.emit('cache_cleanup_complete', {
+            'job_id': job_id,
+            'status': job['status'],
+            'message': job['message'],
+            'details': job['result'],
+            'space_freed': job['result']['total_cleaned'] if job['result'] else 0,
+            'files_removed': job['result']['files_removed'] if job['result'] else 0,
+            'cache_info': slow_collectors.value('cache_info')
+        })
+
+@app.route('/api/history')
+def history_query():
+    """
+    Query metric history.
+    Parameters: metric (comma-separated or repeated), start and end (epoch
+    seconds; end defaults to now and start to one hour before end), step
+    (seconds or a duration such as 5m), agg (avg, min, max, last or a
+    percentile such as p95) and format (json or binary). Responses are
+    gzip-compressed when the client accepts it.
+    """
+    try:
+        metrics = [name for value in request.args.getlist('metric') for name in value.split(',') if name]
+        if not metrics:
+            return jsonify({'status': 'error', 'message': 'metric is required'}), 400
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 3600))
+        step = history.parse_duration(request.args['step']) if 'step' in request.args else None
+        agg = request.args.get('agg', 'avg')
+        output_format = request.args.get('format', 'json')
+        if output_format not in ('json', 'binary'):
+            return jsonify({'status': 'error', 'message': f'Unknown format: {output_format}'}), 400
+        
+        store = metric_history
+        if 'host' in request.args:
+            remote = remote_hosts.get(request.args['host'])
+            if remote is None:
+                return jsonify({'status': 'error', 'message': 'Unknown host'}), 404
+            store = remote['history']
+        
+        timestamps, values, resolutions = store.query(metrics, start, end, step, agg)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    if output_format == 'binary':
+        # Little-endian doubles: the timestamps, then one block per metric
+        # in request order; missing points are NaN
+        body = array('d', timestamps)
+        for name in metrics:
+            body.extend(float('nan') if value is None else value for value in values[name])
+        if sys.byteorder != 'little':
+            body.byteswap()
+        response = app.response_class(body.tobytes(), mimetype='application/octet-stream')
+        response.headers['X-Metrics'] = ','.join(metrics)
+        response.headers['X-Points'] = str(len(timestamps))
+    else:
+        response = jsonify({
+            'metrics': metrics,
+            'start': start,
+            'end': end,
+            'step': timestamps[1] - timestamps[0] if len(timestamps) > 1 else step,
+            'agg': agg,
+            'resolution': resolutions,
+            'timestamps': timestamps,
+            'values': values
+        })
+    
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and response.content_length > 1024:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """OpenMetrics exposition of the latest snapshot (rendered per tick, never collected here)."""
+    compressed = 'gzip' in request.headers.get('Accept-Encoding', '')
+    body = metrics_exposition.body(compressed)
+    if body is None:
+        return app.response_class("No metrics collected yet\n", status=503, mimetype='text/plain')
+    response = app.response_class(body, content_type=exposition.CONTENT_TYPE)
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest():
+    """
+    Accept a batch pushed by an agent: JSON (optionally gzip-compressed)
+    {'host': name, 'samples': [[timestamp, {series: value}], ...]}.
+    Samples are recorded in the host's history; samples not newer than the
+    host's latest one are dropped.
+    """
+    if INGEST_TOKEN and request.headers.get('Authorization') != f'Bearer {INGEST_TOKEN}':
+        return jsonify({'status': 'error', 'message': 'Invalid ingest token'}), 401
+    if request.content_length is not None and request.content_length > MAX_INGEST_BYTES:
+        return jsonify({'status': 'error', 'message': 'Batch too large'}), 413
+    
+    # Backpressure: tell agents to retry later instead of queueing requests
+    if not ingest_slots.acquire(blocking=False):
+        response = jsonify({'status': 'error', 'message': 'Server busy'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(INGEST_RETRY_AFTER)
+        return response
+    
+    try:
+        body = request.get_data()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            decompressor = zlib.decompressobj(wbits=31)
+            body = decompressor.decompress(body, MAX_INGEST_BYTES)
+            if decompressor.unconsumed_tail:
+                return jsonify({'status': 'error', 'message': 'Batch too large'}), 413
+        batch = json.loads(body)
+        host = batch.get('host')
+        if not isinstance(host, str) or not HOST_NAME_PATTERN.match(host):
+            return jsonify({'status': 'error', 'message': 'Invalid host name'}), 400
+        samples, rejected = parse_ingest_samples(batch['samples'])
+        accepted, dropped = record_host_samples(host, samples)
+    except IngestRefused as e:
+        response = jsonify({'status': 'error', 'message': str(e)})
+        response.status_code = e.status
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    except (ValueError, TypeError, KeyError, AttributeError, zlib.error) as e:
+        return jsonify({'status': 'error', 'message': f'Invalid batch: {str(e)}'}), 400
+    finally:
+        ingest_slots.release()
+    
+    return jsonify({'status': 'success', 'accepted': accepted, 'dropped': dropped, 'rejected': rejected})
+
+def parse_ingest_samples(raw_samples):
+    """
+    Convert [[timestamp, {series: value}], ...] to floats. Samples with a
+    non-finite timestamp or value, or a timestamp more than MAX_CLOCK_SKEW
+    ahead of our clock, are rejected. Returns (samples, rejected count).
+    Raises ValueError for a series name the agent could not have sent.
+    """
+    latest = time.time() + MAX_CLOCK_SKEW
+    samples = []
+    rejected = 0
+    for timestamp, values in raw_samples:
+        for name in values:
+            if not isinstance(name, str) or not SERIES_NAME_PATTERN.match(name):
+                raise ValueError(f"invalid series name {str(name)[:64]!r}")
+        timestamp = float(timestamp)
+        values = {name: float(value) for name, value in values.items()}
+        if not math.isfinite(timestamp) or timestamp > latest \
+                or not all(math.isfinite(value) for value in values.values()):
+            rejected += 1
+            continue
+        samples.append((timestamp, values))
+    return samples, rejected
+
+@app.route('/api/fleet')
+def fleet_query():
+    """
+    Rank hosts by a metric.
+    Parameters: metric (default cpu), agg (last, avg, min or max), window
+    (e.g. 15m; required unless agg is last), limit (default 10), order (desc
+    or asc), max_age (seconds since the host last reported) and filter
+    (repeatable), e.g. 'disk[*].percent > 90' or 'avg(memory, 5m) > 80'.
+    """
+    start = time.perf_counter()
+    try:
+        order = request.args.get('order', 'desc')
+        if order not in ('asc', 'desc'):
+            return jsonify({'status': 'error', 'message': f'Unknown order: {order}'}), 400
+        max_age = request.args.get('max_age')
+        total, hosts = fleet_index.top(
+            request.args.get('metric', 'cpu'),
+            agg=request.args.get('agg', 'last'),
+            window=request.args.get('window'),
+            limit=request.args.get('limit', 10),
+            filters=request.args.getlist('filter'),
+            ascending=order == 'asc',
+            max_age=float(max_age) if max_age is not None else None
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    return jsonify({
+        'total': total,
+        'hosts': hosts,
+        'query_ms': round((time.perf_counter() - start) * 1000, 3)
+    })
+
+def record_host_samples(host, samples):
+    """
+    Record (timestamp, values) samples for a remote host; returns (accepted,
+    dropped). Raises IngestRefused if the host is new and MAX_REMOTE_HOSTS are
+    reporting, or if the batch would take the host past MAX_SERIES_PER_HOST.
+    """
+    names = set()
+    for _, values in samples:
+        names.update(values)
+    if len(names) > MAX_SERIES_PER_HOST:
+        raise IngestRefused(f'Too many series for one host (max {MAX_SERIES_PER_HOST})', 413)
+    
+    with remote_hosts_lock:
+        remote = remote_hosts.get(host)
+        if remote is None:
+            if len(remote_hosts) >= MAX_REMOTE_HOSTS:
+                logger.warning(f"Ignoring new host {host}: {MAX_REMOTE_HOSTS} hosts already reporting")
+                raise IngestRefused('Too many hosts reporting', 503, REMOTE_HOSTS_FULL_RETRY_AFTER)
+            remote = remote_hosts[host] = {
+                'history': history.HistoryStore(capacity=REMOTE_HISTORY_POINTS, tiers=REMOTE_HISTORY_TIERS),
+                'last_timestamp': float('-inf'),
+                'last_seen': None,
+                'lock': threading.Lock()
+            }
+            logger.info(f"New host reporting: {host}")
+    
+    accepted = dropped = 0
+    with remote['lock']:
+        new_names = [name for name in names if name not in remote['history']]
+        if new_names and len(remote['history'].names()) + len(new_names) > MAX_SERIES_PER_HOST:
+            logger.warning(f"Refusing batch from {host}: more than {MAX_SERIES_PER_HOST} series")
+            raise IngestRefused(f'Too many series for one host (max {MAX_SERIES_PER_HOST})', 413)
+        for timestamp, values in sorted(samples, key=lambda sample: sample[0]):
+            # History buffers are ordered by time; late samples cannot be inserted
+            if timestamp <= remote['last_timestamp']:
+                dropped += 1
+                continue
+            remote['history'].record(values, timestamp)
+            fleet_index.update(host, timestamp, values)
+            remote['last_timestamp'] = timestamp
+            accepted += 1
+        remote['last_seen'] = time.time()
+    return accepted, dropped
+
+def evict_silent_hosts():
+    """Forget remote hosts that have not reported for REMOTE_HOST_TTL seconds."""
+    oldest = time.time() - REMOTE_HOST_TTL
+    with remote_hosts_lock:
+        silent = [host for host, remote in remote_hosts.items()
+                  if remote['last_seen'] is not None and remote['last_seen'] < oldest]
+        for host in silent:
+            del remote_hosts[host]
+    for host in silent:
+        fleet_index.remove(host)
+        logger.info(f"Forgot host {host} after {REMOTE_HOST_TTL}s without samples")
 
 def update_system_metrics():
     """
     Collect system metrics and emit them via SocketIO.
     Also stores historical data and checks for alerts.
     """
+    global refresh_requested
+    with refresh_lock:
+        refresh_requested = False
+    
+    # Each stage is timed (see /api/debug/perf); a requested profile
+    # capture covers whole ticks
+    with perf.registry.profile_tick(), perf.timed('tick'):
+        _update_system_metrics()
+
+def _update_system_metrics():
+    """One collection tick: collect, record, broadcast and check alerts."""
     try:
-        # Get current metrics
-        cpu_percent = monitor.get_cpu_usage()
-        memory_info = monitor.get_memory_usage()
-        disk_usage = monitor.get_disk_usage()
-        network_info = monitor.get_network_info()
-        current_logs = monitor.get_system_logs(10)  # Get latest 10 logs
+        # Collect every metric exactly once for this tick
+        with perf.timed('tick.collect'):
+            snapshot = monitor.Snapshot.collect(process_count=15)
+        cpu_percent = snapshot.cpu_percent
+        memory_info = snapshot.memory
+        disk_usage = snapshot.disk
+        network_info = snapshot.network
+        current_logs = snapshot.logs(10)  # Get latest 10 logs
         
-        # Update disk information (less frequently)
-        global disk_info
-        if not disk_info or len(historical_data.get('timestamps', [])) % 10 == 0:  # Every 10 minutes
-            disk_info = monitor.get_disk_info()
-        
-        # Get cache information (less frequently to avoid excessive file system scans)
-        global cache_info
-        if not cache_info or len(historical_data.get('timestamps', [])) % 20 == 0:  # Every 10 minutes
-            cache_info = monitor.get_cache_info()
+        # Latest results of the slow collectors, refreshed by their own jobs
+        disk_info = slow_collectors.value('disk_info')
+        cache_info = slow_collectors.value('cache_info')
         
         # Update system logs
         global system_logs
@@ -225,114 +609,226 @@ def update_system_metrics():
             'seconds': int(uptime_seconds % 60)
         }
         
-        # Update historical data
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        
-        # Make sure all the lists exist
-        if 'cpu' not in historical_data:
-            historical_data['cpu'] = []
-        if 'memory' not in historical_data:
-            historical_data['memory'] = []
-        if 'disk' not in historical_data:
-            historical_data['disk'] = []
-        if 'network' not in historical_data:
-            historical_data['network'] = {'sent': [], 'received': []}
-        if 'timestamps' not in historical_data:
-            historical_data['timestamps'] = []
-            
-        # Add new data points
-        historical_data['cpu'].append(cpu_percent)
-        historical_data['memory'].append(memory_info['percent'])
-        historical_data['disk'].append(disk_usage['percent'])
-        historical_data['network']['sent'].append(network_info['bytes_sent'] / 1024)  # KB
-        historical_data['network']['received'].append(network_info['bytes_recv'] / 1024)  # KB
-        historical_data['timestamps'].append(timestamp)
+        # Update historical data, including our own timings (p95 in ms)
+        with perf.timed('tick.history'):
+            samples = snapshot.samples(disk_info)
+            samples.update(perf.registry.samples())
+            metric_history.record(samples, snapshot.timestamp.timestamp())
+            fleet_index.update(LOCAL_HOST, snapshot.timestamp.timestamp(), samples)
         
-        # Limit historical data to last 24 hours (1440 minutes)
-        if len(historical_data['timestamps']) > HISTORY_POINTS:
-            historical_data['cpu'] = historical_data['cpu'][-HISTORY_POINTS:]
-            historical_data['memory'] = historical_data['memory'][-HISTORY_POINTS:]
-            historical_data['disk'] = historical_data['disk'][-HISTORY_POINTS:]
-            historical_data['network']['sent'] = historical_data['network']['sent'][-HISTORY_POINTS:]
-            historical_data['network']['received'] = historical_data['network']['received'][-HISTORY_POINTS:]
-            historical_data['timestamps'] = historical_data['timestamps'][-HISTORY_POINTS:]
-        
-        # Get top processes by resource usage
-        processes = monitor.get_processes(15)  # Get top 15 processes
+        # Top processes by resource usage
+        processes = snapshot.processes
 
-        # Prepare data to emit
+        # Prepare data to emit. Per-interface and per-disk I/O detail changes
+        # every tick and is not shown on the dashboard, so it is left to
+        # /api/history instead of being resent in every delta
         data = {
             'cpu': {
                 'percent': cpu_percent,
-                'cores': monitor.get_cpu_info()
+                'cores': snapshot.cpu_info
             },
             'memory': memory_info,
             'disk': disk_usage,
             'disk_info': disk_info,
-            'network': network_info,
+            'network': {'rates': network_info['rates']},
             'logs': system_logs[-10:],  # Send only last 10 logs
             'processes': processes,  # Add processes information
             'cache_info': cache_info,  # Add cache information
             'uptime': uptime,
-            'historical': {
-                'cpu': historical_data['cpu'][-60:],  # Last 60 minutes for charts
-                'memory': historical_data['memory'][-60:],
-                'disk': historical_data['disk'][-60:],
-                'network': {
-                    'sent': historical_data['network']['sent'][-60:],
-                    'received': historical_data['network']['received'][-60:]
-                },
-                'timestamps': historical_data['timestamps'][-60:]
-            }
+            'historical': get_chart_history(CHART_POINTS)
         }
         
-        # Emit data via SocketIO
-        socketio.emit('system_metrics', data)
+        # Pre-render the Prometheus exposition from the same snapshot
+        with perf.timed('tick.exposition'):
+            metrics_exposition.update(snapshot, disk_info, cache_info)
         
-        # Check for alerts
-        if alert_settings['alerts_enabled']:
-            # CPU alert
-            if cpu_percent > alert_settings['cpu_threshold']:
-                alert_message = f"CPU usage is high: {cpu_percent}% (threshold: {alert_settings['cpu_threshold']}%)"
-                send_alerts("High CPU Usage", alert_message)
-                
-            # Memory alert
-            if memory_info['percent'] > alert_settings['memory_threshold']:
-                alert_message = f"Memory usage is high: {memory_info['percent']}% (threshold: {alert_settings['memory_threshold']}%)"
-                send_alerts("High Memory Usage", alert_message)
-                
-            # Disk alert
-            if disk_usage['percent'] > alert_settings['disk_threshold']:
-                alert_message = f"Disk usage is high: {disk_usage['percent']}% (threshold: {alert_settings['disk_threshold']}%)"
-                send_alerts("High Disk Usage", alert_message)
+        # Broadcast only what changed since the previous tick; clients get
+        # the full payload on connect
+        with perf.timed('tick.delta'):
+            changes = payload_encoder.update(data, history_added=1)
+        with perf.timed('emit.system_metrics_delta'):
+            socketio.emit('system_metrics_delta', changes)
+        
+        # Clients that connected before the first payload get the full state
+        with refresh_lock:
+            waiting = list(waiting_clients)
+            waiting_clients.clear()
+        for sid in waiting:
+            with perf.timed('emit.system_metrics'):
+                socketio.emit('system_metrics', payload_encoder.full(), to=sid)
+        
+        # Check for alerts; rules only notify on state changes and re-notify intervals
+        with perf.timed('tick.alerts'):
+            check_alerts({
+                'cpu': cpu_percent,
+                'memory': memory_info['percent'],
+                'disk': disk_usage['percent']
+            }, snapshot.timestamp.timestamp(), samples)
         
     except Exception as e:
         logger.exception("Error updating system metrics")
 
+@perf.timed_function('tick.chart_history')
+def get_chart_history(count):
+    """Get the newest `count` points of the charted series."""
+    timestamps, cpu = metric_history.window('cpu', count)
+    return {
+        'cpu': cpu.tolist(),
+        'memory': metric_history.window('memory', count)[1].tolist(),
+        'disk': metric_history.window('disk', count)[1].tolist(),
+        'network': {
+            # KB/s
+            'sent': [rate / 1024 for rate in metric_history.window('net.bytes_sent', count)[1]],
+            'received': [rate / 1024 for rate in metric_history.window('net.bytes_recv', count)[1]]
+        },
+        'timestamps': [datetime.fromtimestamp(ts).strftime("%H:%M:%S") for ts in timestamps]
+    }
+
+def apply_alert_settings(settings):
+    """Make settings the active alert settings, keeping the rules' state."""
+    global alert_settings
+    alert_settings = settings
+    alert_rules.build_threshold_rules(alert_settings, alert_rule_states)
+    expression_rules.configure(alert_settings['alert_rules'], alert_settings)
+    alert.dispatcher.digest_window = alert_settings['alert_digest_window']
+
+def check_alerts(values, now, samples=None):
+    """
+    Feed the latest values to the alert rules and send any due notifications.
+    samples are the series recorded this tick, used by the expression rules.
+    """
+    # Pick up changes made to the settings file outside the settings page
+    settings = config.load_alert_settings()
+    if settings is not alert_settings:
+        apply_alert_settings(settings)
+    
+    if not alert_settings['alerts_enabled']:
+        for rule in alert_rule_states.values():
+            rule.reset()
+        # Keep the expression rules' windows current while alerts are off
+        expression_rules.observe(samples or {}, now)
+        expression_rules.reset()
+        return
+    
+    for name, value in values.items():
+        rule = alert_rule_states[name]
+        event = rule.evaluate(value, now)
+        if event is not None:
+            send_alerts(*rule.notification(event))
+    
+    for rule, event in expression_rules.evaluate(samples or {}, now, monitor.process_tracker.by_name):
+        send_alerts(*rule.notification(event))
+
+@app.route('/api/collectors')
+def collector_status():
+    """Get the schedule and last-run statistics of the slow collectors."""
+    return jsonify(slow_collectors.status())
+
+@app.route('/api/debug/perf')
+def perf_stats():
+    """Get timing percentiles of the collectors, tick stages, alert channels and emits."""
+    return jsonify({
+        'timers': perf.registry.stats(),
+        'profile': perf.registry.profile_status()
+    })
+
+@app.route('/api/debug/perf/profile', methods=['GET', 'POST'])
+def perf_profile():
+    """
+    POST {"ticks": N} to profile the next N metric ticks with cProfile;
+    GET the capture's progress or its report once finished.
+    """
+    if request.method == 'GET':
+        return jsonify(perf.registry.profile_status())
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        ticks = int(data.get('ticks', 1))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'ticks must be an integer'}), 400
+    if not perf.registry.start_profile(ticks):
+        return jsonify({'status': 'error', 'message': 'A profile capture is already running'}), 409
+    return jsonify(perf.registry.profile_status()), 202
+
+@app.route('/api/alerts')
+def alert_states():
+    """Get the current state of every alert rule."""
+    rules = list(alert_rule_states.values()) + list(expression_rules.rules.values())
+    return jsonify([rule.as_dict() for rule in rules])
+
 def send_alerts(title, message):
-    """Send alerts via configured methods."""
+    """Queue alerts for the configured methods; delivery happens on the dispatcher workers."""
     if alert_settings['email_alerts']:
         email_config = alert.get_email_config()
         if email_config.get('email_from') and email_config.get('email_to'):
-            alert.send_email_alert(title, message, email_config)
+            alert.dispatcher.enqueue('email', title, message, email_config)
     
     if alert_settings['discord_alerts']:
         discord_config = alert.get_discord_config()
         if discord_config.get('webhook_url'):
-            alert.send_discord_alert(title, message, discord_config)
+            alert.dispatcher.enqueue('discord', title, message, discord_config)
+
+def request_refresh():
+    """
+    Run the collection job as soon as possible.
+    Requests made while one is already pending are coalesced into it.
+    """
+    global refresh_requested
+    with refresh_lock:
+        if refresh_requested:
+            return
+        refresh_requested = True
+    
+    job = scheduler.get_job(METRICS_JOB_ID)
+    if job is not None:
+        job.modify(next_run_time=datetime.now(scheduler.timezone))
+    else:
+        socketio.start_background_task(update_system_metrics)
 
 @socketio.on('connect')
 def handle_connect(auth=None):
-    """Handle client connection and send initial data."""
+    """
+    Handle client connection and send initial data.
+    Only the cached payload is sent; collection happens on the scheduler.
+    """
     logger.info("Client connected")
-    # Force an immediate update
-    update_system_metrics()
+    payload = payload_encoder.full()
+    if payload is None:
+        # Nothing collected yet; the first tick sends this client the full state
+        with refresh_lock:
+            waiting_clients.add(request.sid)
+        request_refresh()
+        return
+    
+    # Send the full state to this client; later ticks only send deltas
+    with perf.timed('emit.system_metrics'):
+        emit('system_metrics', payload, to=request.sid)
+    if SNAPSHOT_MAX_AGE and payload_encoder.age() > SNAPSHOT_MAX_AGE:
+        request_refresh()
+
+@socketio.on('disconnect')
+def handle_disconnect(reason=None):
+    """Forget a client that was still waiting for its first payload."""
+    with refresh_lock:
+        waiting_clients.discard(request.sid)
+
+@socketio.on('request_full_snapshot')
+def send_full_snapshot():
+    """Send the latest full payload to the requesting client."""
+    payload = payload_encoder.full()
+    if payload is not None:
+        with perf.timed('emit.system_metrics'):
+            emit('system_metrics', payload, to=request.sid)
 
 def start_scheduler():
     """Start the background scheduler for metric collection."""
     if not scheduler.running:
-        scheduler.add_job(update_system_metrics, 'interval', seconds=30)
+        scheduler.add_job(update_system_metrics, 'interval', seconds=30, id=METRICS_JOB_ID)
+        scheduler.add_job(evict_silent_hosts, 'interval', minutes=10, id='evict_silent_hosts')
+        slow_collectors.start()
         scheduler.start()
+        alert.dispatcher.digest_window = alert_settings['alert_digest_window']
+        alert.dispatcher.start()
         logger.info("Scheduler started")
 
 # Start the scheduler when the application starts
@@ -343,6 +839,10 @@ def shutdown_scheduler():
     if scheduler.running:
         scheduler.shutdown()
         logger.info("Scheduler shutdown")
+    alert.dispatcher.stop()
+    alert.close_channels()
+    if metric_history.segments is not None:
+        metric_history.segments.close()
 
 # Register the shutdown function
 import atexit
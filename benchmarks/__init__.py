@@ -0,0 +1,17 @@
+"""
+Benchmarks for the collectors, the history store and the dashboard payload.
+
+Run from the repository root:
+
+    python -m benchmarks              # compare with benchmarks/baseline.json
+    python -m benchmarks --update     # store the results as the new baseline
+    python -m benchmarks --full       # also run the 100k and 1M file trees
+    python -m benchmarks -k history   # only benchmarks matching a regex
+
+Everything runs offline: psutil's process table is replaced by synthetic
+processes, cache trees are generated in a temporary directory and the
+payload is built from a synthetic snapshot. Baselines are scaled by a
+calibration workload so they carry over between machines; a benchmark
+fails when it is slower than its scaled baseline by more than the
+tolerance (50% by default, --tolerance or $BENCH_TOLERANCE).
+"""
@@ -0,0 +1,45 @@
+import monitor
+from benchmarks import fixtures
+from benchmarks.runner import benchmark
+
+# Generated tree sizes (files); the larger ones only run with --full
+TREE_SIZES = (10000,)
+FULL_TREE_SIZES = (100000, 1000000)
+
+
+def _label(files):
+    return f"{files // 1000}k" if files < 1000000 else f"{files // 1000000}M"
+
+
+def _scan_cold(files):
+    """get_cache_info() with an empty cache index, listing every directory."""
+    def factory():
+        tree = fixtures.cache_tree(files)
+        with fixtures.cache_paths([tree]):
+            yield monitor.get_cache_info
+    return factory
+
+
+def _scan_warm(files):
+    """get_cache_info() on an unchanged tree, served from the cache index."""
+    def factory():
+        tree = fixtures.cache_tree(files)
+        with fixtures.cache_paths([tree]):
+            monitor.get_cache_info()
+            yield monitor.get_cache_info
+    return factory
+
+
+def _clean(files):
+    """clean_cache_files() deleting a whole generated tree."""
+    def factory():
+        tree = fixtures.disposable_tree(files)
+        yield lambda: monitor.clean_cache_files([tree])
+    return factory
+
+
+for _files in TREE_SIZES + FULL_TREE_SIZES:
+    _full = _files in FULL_TREE_SIZES
+    benchmark(f"cache.get_cache_info.cold[{_label(_files)}]", repeat=3, setup_each=True, full=_full)(_scan_cold(_files))
+    benchmark(f"cache.get_cache_info.warm[{_label(_files)}]", full=_full)(_scan_warm(_files))
+    benchmark(f"cache.clean_cache_files[{_label(_files)}]", repeat=3, setup_each=True, full=_full)(_clean(_files))
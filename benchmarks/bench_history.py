@@ -0,0 +1,85 @@
+import history
+from benchmarks.runner import benchmark
+
+# Store sizes as (span in seconds, seconds between samples). A year is
+# filled at 5 minute spacing to keep setup around a second; the rollup
+# tiers end up just as full.
+HISTORY_SIZES = {
+    '24h': (86400, 60),
+    '7d': (7 * 86400, 60),
+    '1y': (365 * 86400, 300)
+}
+
+# Points read for the dashboard charts
+CHART_POINTS = 60
+
+# Series recorded per tick by the append benchmark, roughly one tick of a
+# 16 core machine with a few disks and interfaces
+TICK_SERIES = 60
+
+# Fixed end of the filled history, so runs are reproducible
+HISTORY_END = 1700000000.0
+
+_stores = {}
+
+
+def _fill(size):
+    span, step = HISTORY_SIZES[size]
+    store = history.HistoryStore()
+    start = HISTORY_END - span
+    for index in range(span // step):
+        store.record({'cpu': index % 100}, start + index * step)
+    return store
+
+
+def _filled(size):
+    """A filled store shared by the read benchmarks (do not write to it)."""
+    store = _stores.get(size)
+    if store is None:
+        store = _stores[size] = _fill(size)
+    return store
+
+
+def _record(size):
+    def factory():
+        store = _fill(size)
+        names = ['cpu'] + [f"series[{index}]" for index in range(TICK_SERIES - 1)]
+        state = {'timestamp': HISTORY_END}
+
+        def run():
+            state['timestamp'] += 60
+            store.record({name: 50.0 for name in names}, state['timestamp'])
+        yield run
+    return factory
+
+
+def _window(size):
+    def factory():
+        store = _filled(size)
+        yield lambda: store.window('cpu', CHART_POINTS)
+    return factory
+
+
+def _read(size):
+    """Read the whole span from the cheapest tier, as the history API does."""
+    def factory():
+        store = _filled(size)
+        span, _ = HISTORY_SIZES[size]
+        yield lambda: store.read('cpu', HISTORY_END - span, HISTORY_END)
+    return factory
+
+
+def _query(size):
+    """Query the whole span in 300 average buckets."""
+    def factory():
+        store = _filled(size)
+        span, _ = HISTORY_SIZES[size]
+        yield lambda: store.query(['cpu'], HISTORY_END - span, HISTORY_END, step=span / 300)
+    return factory
+
+
+for _size in HISTORY_SIZES:
+    benchmark(f"history.record[{_size}]")(_record(_size))
+    benchmark(f"history.window[{_size}]")(_window(_size))
+    benchmark(f"history.read[{_size}]")(_read(_size))
+    benchmark(f"history.query[{_size}]")(_query(_size))
@@ -0,0 +1,45 @@
+import json
+import contextlib
+from unittest import mock
+
+import monitor
+from benchmarks import fixtures
+from benchmarks.runner import benchmark
+
+# Ticks run before timing, so the history and the delta encoder are warm
+WARMUP_TICKS = 5
+
+
+def _serialize_emit(event, data, **kwargs):
+    """Socket.IO stand-in that serializes what would be sent."""
+    json.dumps(data)
+
+
+@contextlib.contextmanager
+def _ticking(app):
+    """Feed update_system_metrics() synthetic snapshots and run a few ticks."""
+    snapshots = fixtures.SnapshotFactory()
+    app.slow_collectors.collectors['disk_info'].value = snapshots.disk_info()
+    app.slow_collectors.collectors['cache_info'].value = snapshots.cache_info()
+    with mock.patch.object(monitor.Snapshot, 'collect', snapshots), \
+            mock.patch.object(app.socketio, 'emit', _serialize_emit):
+        for _ in range(WARMUP_TICKS):
+            app.update_system_metrics()
+        yield
+
+
+@benchmark("payload.update_system_metrics")
+def update_system_metrics():
+    """One whole tick: history, exposition, delta build and its serialization, alerts."""
+    app = fixtures.load_app()
+    with _ticking(app):
+        yield app.update_system_metrics
+
+
+@benchmark("payload.serialize.full")
+def serialize_full():
+    """The full payload sent to a connecting client."""
+    app = fixtures.load_app()
+    with _ticking(app):
+        payload = app.payload_encoder.full()
+        yield lambda: json.dumps(payload)
@@ -0,0 +1,35 @@
+import monitor
+from benchmarks import fixtures
+from benchmarks.runner import benchmark
+
+# Synthetic process table sizes
+PROCESS_COUNTS = (100, 1000, 5000)
+
+# Processes returned per call, as on the dashboard
+TOP_COUNT = 15
+
+
+def _warm(count, sort_by='rss'):
+    """get_processes() on a tracker that already follows every process."""
+    def factory():
+        with fixtures.fake_processes(count):
+            monitor.get_processes(TOP_COUNT, sort_by)
+            yield lambda: monitor.get_processes(TOP_COUNT, sort_by)
+    return factory
+
+
+def _cold(count):
+    """get_processes() with a new tracker, as on the first tick after startup."""
+    def factory():
+        with fixtures.fake_processes(count):
+            def run():
+                monitor.process_tracker = monitor.ProcessTracker(min_interval=0)
+                monitor.get_processes(TOP_COUNT)
+            yield run
+    return factory
+
+
+for _count in PROCESS_COUNTS:
+    benchmark(f"processes.get_processes[{_count}]")(_warm(_count))
+benchmark("processes.get_processes.io[1000]")(_warm(1000, 'io'))
+benchmark("processes.get_processes.cold[1000]")(_cold(1000))
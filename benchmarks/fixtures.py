@@ -0,0 +1,276 @@
+import os
+import random
+import itertools
+import shutil
+import logging
+import tempfile
+import contextlib
+from collections import namedtuple
+from datetime import datetime
+from unittest import mock
+
+import psutil
+from apscheduler.schedulers.background import BackgroundScheduler
+
+import alert
+import config
+import monitor
+from monitor import NET_COUNTERS
+from cache_index import CacheIndex
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Generated cache trees: files per directory and directories per level
+FILES_PER_DIR = 100
+DIRS_PER_LEVEL = 100
+
+# Shape of the synthetic snapshot used for payload benchmarks
+SNAPSHOT_CORES = 16
+SNAPSHOT_INTERFACES = ('eth0', 'eth1', 'wlan0', 'docker0')
+SNAPSHOT_DISKS = ('nvme0n1', 'nvme1n1', 'sda', 'sdb')
+SNAPSHOT_PARTITIONS = 6
+SNAPSHOT_PROCESSES = 15
+
+_tmp_root = None
+_trees = {}
+_index_ids = itertools.count()
+_app = None
+_app_patches = contextlib.ExitStack()
+
+_CpuTimes = namedtuple('pcputimes', 'user system')
+_MemoryInfo = namedtuple('pmem', 'rss vms')
+_IoCounters = namedtuple('pio', 'read_count write_count read_bytes write_bytes')
+_VirtualMemory = namedtuple('svmem', 'total available percent used free')
+
+
+def tmpdir():
+    """Temporary directory shared by every benchmark in this run."""
+    global _tmp_root
+    if _tmp_root is None:
+        _tmp_root = tempfile.mkdtemp(prefix='pchealth-bench-')
+    return _tmp_root
+
+
+def cleanup():
+    """Remove everything the benchmarks generated."""
+    global _tmp_root
+    if _app is not None:
+        _app.shutdown_scheduler()
+    _app_patches.close()
+    if _tmp_root is not None:
+        shutil.rmtree(_tmp_root, ignore_errors=True)
+        _tmp_root = None
+    _trees.clear()
+
+
+# Processes
+
+class FakeProcess:
+    """Stand-in for psutil.Process with deterministic, slowly changing values."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self._cpu_time = float(pid % 97)
+        self._io_bytes = pid * 4096
+
+    def create_time(self):
+        return 1700000000.0 + self.pid
+
+    def name(self):
+        return f"process-{self.pid % 50}"
+
+    def username(self):
+        return 'bench'
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def cpu_times(self):
+        self._cpu_time += (self.pid % 7) * 0.01
+        return _CpuTimes(self._cpu_time * 0.7, self._cpu_time * 0.3)
+
+    def cpu_percent(self):
+        return float(self.pid * 7 % 100)
+
+    def memory_info(self):
+        rss = (self.pid * 2654435761 % 512) * 1024 * 1024
+        return _MemoryInfo(rss, rss * 2)
+
+    def io_counters(self):
+        self._io_bytes += (self.pid % 13) * 1024
+        return _IoCounters(self.pid, self.pid, self._io_bytes, self._io_bytes // 2)
+
+    def num_fds(self):
+        return self.pid % 200
+
+
+@contextlib.contextmanager
+def fake_processes(count):
+    """
+    Replace psutil's process table with `count` synthetic processes and give
+    get_processes() a fresh tracker without a minimum refresh interval.
+    """
+    pids = list(range(1, count + 1))
+    memory = _VirtualMemory(64 * 1024 ** 3, 32 * 1024 ** 3, 50.0, 32 * 1024 ** 3, 16 * 1024 ** 3)
+    with mock.patch.object(psutil, 'pids', lambda: pids), \
+            mock.patch.object(psutil, 'Process', FakeProcess), \
+            mock.patch.object(psutil, 'virtual_memory', lambda: memory), \
+            mock.patch.object(monitor, 'process_tracker', monitor.ProcessTracker(min_interval=0)):
+        yield
+
+
+# Cache trees
+
+def _write_tree(root, files):
+    """Create `files` small files below root, FILES_PER_DIR per directory."""
+    directories = max(1, files // FILES_PER_DIR)
+    written = 0
+    for index in range(directories):
+        directory = os.path.join(root, f"d{index // DIRS_PER_LEVEL:04d}", f"d{index % DIRS_PER_LEVEL:02d}")
+        os.makedirs(directory, exist_ok=True)
+        for number in range(min(FILES_PER_DIR, files - written)):
+            with open(os.path.join(directory, f"f{number:03d}.tmp"), 'wb') as f:
+                f.write(b'x' * (number % 64 + 1))
+        written += FILES_PER_DIR
+    return root
+
+
+def cache_tree(files):
+    """A generated tree of `files` files, shared by every benchmark (do not modify)."""
+    root = _trees.get(files)
+    if root is None:
+        root = _trees[files] = _write_tree(os.path.join(tmpdir(), f"tree-{files}"), files)
+    return root
+
+
+def disposable_tree(files):
+    """A freshly generated tree of `files` files, for benchmarks that delete it."""
+    return _write_tree(tempfile.mkdtemp(prefix='clean-', dir=tmpdir()), files)
+
+
+@contextlib.contextmanager
+def cache_paths(paths, index=None):
+    """Point get_cache_info() at `paths`, with an empty cache index unless one is given."""
+    if index is None:
+        index = CacheIndex(index_file=os.path.join(tmpdir(), f"cache-index-{next(_index_ids)}.json"))
+    with mock.patch.object(monitor, 'get_cache_paths', lambda: list(paths)), \
+            mock.patch.object(monitor, 'cache_index', index):
+        yield index
+
+
+# Dashboard payload
+
+class SnapshotFactory:
+    """Builds synthetic snapshots whose values drift a little every tick."""
+
+    def __init__(self, seed=42):
+        self.random = random.Random(seed)
+        self.counters = {nic: {field: 0 for field in NET_COUNTERS} for nic in SNAPSHOT_INTERFACES}
+        self.processes = [{
+            'pid': 1000 + index,
+            'name': f"process-{index}",
+            'username': 'bench',
+            'memory_percent': 0.0,
+            'cpu_percent': 0.0,
+            'create_time': '2024-01-01 00:00:00'
+        } for index in range(SNAPSHOT_PROCESSES)]
+
+    def _percent(self):
+        return round(self.random.uniform(0, 100), 1)
+
+    def disk_info(self):
+        return [{
+            'device': f"/dev/sd{chr(97 + index)}1",
+            'mountpoint': '/' if index == 0 else f"/mnt/data{index}",
+            'fstype': 'ext4',
+            'total': 512.0,
+            'used': 256.0,
+            'free': 256.0,
+            'percent': 50.0,
+            'total_bytes': 512 * 1024 ** 3,
+            'used_bytes': 256 * 1024 ** 3,
+            'free_bytes': 256 * 1024 ** 3
+        } for index in range(SNAPSHOT_PARTITIONS)]
+
+    def cache_info(self):
+        return {'total_size': 123456789, 'file_count': 4321, 'paths': {'/tmp': {'size': 123456789, 'file_count': 4321}}}
+
+    def __call__(self, process_count=15):
+        interfaces = {}
+        for nic, counters in self.counters.items():
+            rates = {field: float(self.random.randint(0, 100000)) for field in NET_COUNTERS}
+            for field, rate in rates.items():
+                counters[field] += int(rate)
+            interfaces[nic] = rates
+        network = {field: sum(counters[field] for counters in self.counters.values()) for field in NET_COUNTERS}
+        network['rates'] = {field: sum(rates[field] for rates in interfaces.values()) for field in NET_COUNTERS}
+        network['interfaces'] = interfaces
+        network['interface_counters'] = {nic: dict(counters) for nic, counters in self.counters.items()}
+
+        processes = [dict(process, memory_percent=self._percent(), cpu_percent=self._percent())
+                     for process in self.processes[:process_count]]
+        disk_io = {disk: {
+            'read_bytes': float(self.random.randint(0, 10 ** 8)),
+            'write_bytes': float(self.random.randint(0, 10 ** 8)),
+            'read_iops': float(self.random.randint(0, 5000)),
+            'write_iops': float(self.random.randint(0, 5000)),
+            'read_latency': round(self.random.uniform(0, 5), 2),
+            'write_latency': round(self.random.uniform(0, 5), 2),
+            'busy': self._percent()
+        } for disk in SNAPSHOT_DISKS}
+
+        return monitor.Snapshot(
+            timestamp=datetime.now(),
+            system_info={
+                'system': 'Linux',
+                'node': 'bench',
+                'release': '6.0.0',
+                'version': '#1 SMP',
+                'machine': 'x86_64',
+                'processor': 'x86_64',
+                'boot_time': '2024-01-01 00:00:00'
+            },
+            cpu_percent=self._percent(),
+            cpu_info={'count': SNAPSHOT_CORES, 'frequency': 3200.0,
+                      'per_core': [self._percent() for _ in range(SNAPSHOT_CORES)]},
+            memory={'total': 64.0, 'used': 32.0, 'free': 32.0, 'percent': self._percent(),
+                    'total_bytes': 64 * 1024 ** 3, 'used_bytes': 32 * 1024 ** 3, 'available_bytes': 32 * 1024 ** 3},
+            disk={'total': 512.0, 'used': 256.0, 'free': 256.0, 'percent': 50.0},
+            network=network,
+            processes=processes,
+            disk_io=disk_io
+        )
+
+
+def _isolate_settings():
+    """
+    Give every settings file (alert thresholds, email, Discord) a path under
+    the benchmark directory, so the run sees the defaults instead of config/,
+    and replace the alert dispatcher so no alert is ever delivered.
+    """
+    config_dir = os.path.join(tmpdir(), 'config')
+    os.makedirs(config_dir, exist_ok=True)
+    isolated = {name: config.SettingsFile(os.path.join(config_dir, os.path.basename(settings.path)), settings.defaults)
+                for name, settings in config.settings_files.items()}
+    _app_patches.enter_context(mock.patch.dict(config.settings_files, isolated))
+    _app_patches.enter_context(mock.patch.object(alert, 'dispatcher', mock.Mock(spec=alert.dispatcher)))
+
+
+def load_app():
+    """
+    Import the Flask app with its history and settings under the benchmark
+    directory, no alert delivery and its scheduler never started, so only
+    the benchmarks drive update_system_metrics() and no collector scans the
+    real machine.
+    """
+    global _app
+    if _app is None:
+        os.environ['HISTORY_DIR'] = os.path.join(tmpdir(), 'history')
+        _isolate_settings()
+        with mock.patch.object(BackgroundScheduler, 'start'):
+            import app
+        # app configures DEBUG logging on import
+        logging.disable(logging.INFO)
+        _app = app
+    return _app
@@ -0,0 +1,221 @@
+import os
+import re
+import sys
+import json
+import time
+import timeit
+import logging
+import argparse
+import platform
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Stored baseline, compared against on every run
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# A benchmark fails when it is this much slower than its baseline (0.5 = 50%)
+# after scaling for the speed of the machine
+DEFAULT_TOLERANCE = float(os.environ.get('BENCH_TOLERANCE', 0.5))
+
+# Timing repeats per benchmark; the fastest repeat is reported
+DEFAULT_REPEAT = 5
+
+# Registered benchmarks, in registration order
+BENCHMARKS = []
+
+
+class Benchmark:
+    """
+    A named benchmark. `factory` is a generator function that sets up its
+    fixtures, yields the callable to time and cleans up after the yield.
+    With setup_each the factory runs again before every (single-call)
+    repeat, for operations that consume their fixture such as deleting files.
+    """
+
+    def __init__(self, name, factory, repeat=DEFAULT_REPEAT, setup_each=False, full=False):
+        self.name = name
+        self.factory = factory
+        self.repeat = repeat
+        self.setup_each = setup_each
+        self.full = full
+
+    def measure(self):
+        """Seconds per call of the fastest repeat."""
+        if self.setup_each:
+            best = float('inf')
+            for _ in range(self.repeat):
+                fixture = self.factory()
+                run = next(fixture)
+                try:
+                    start = time.perf_counter()
+                    run()
+                    best = min(best, time.perf_counter() - start)
+                finally:
+                    fixture.close()
+            return best
+
+        fixture = self.factory()
+        run = next(fixture)
+        try:
+            return _time_callable(run, self.repeat)
+        finally:
+            fixture.close()
+
+
+def benchmark(name, repeat=DEFAULT_REPEAT, setup_each=False, full=False):
+    """Register a benchmark factory; full benchmarks only run with --full."""
+    def decorator(factory):
+        BENCHMARKS.append(Benchmark(name, factory, repeat, setup_each, full))
+        return factory
+    return decorator
+
+
+def _time_callable(run, repeat):
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def _calibration_workload():
+    """Fixed pure-Python work used to scale baselines to the current machine."""
+    total = 0
+    for i in range(20000):
+        total += i * i % 7
+    words = sorted(str(i * 7919 % 10007) for i in range(2000))
+    return total, json.dumps({'words': words})
+
+
+def calibrate():
+    """Seconds per run of the calibration workload."""
+    return _time_callable(_calibration_workload, DEFAULT_REPEAT)
+
+
+def load_baseline(path=BASELINE_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results, calibration, path=BASELINE_FILE):
+    """
+    Store results as the new baseline. Benchmarks that were not run keep
+    their stored value, rescaled to this machine's calibration.
+    """
+    baseline = load_baseline(path)
+    benchmarks = {}
+    if baseline is not None:
+        scale = calibration / baseline['calibration']
+        benchmarks = {name: seconds * scale for name, seconds in baseline['benchmarks'].items()}
+    benchmarks.update(results)
+    data = {
+        'calibration': calibration,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'benchmarks': dict(sorted(benchmarks.items()))
+    }
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+    os.replace(tmp_file, path)
+
+
+def compare(results, calibration, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare results with the baseline scaled to this machine.
+    Returns rows of (name, expected seconds or None, seconds, change or None, status).
+    """
+    rows = []
+    stored = baseline['benchmarks'] if baseline else {}
+    scale = calibration / baseline['calibration'] if baseline else 1.0
+    for name, seconds in results.items():
+        if name not in stored:
+            rows.append((name, None, seconds, None, 'new'))
+            continue
+        expected = stored[name] * scale
+        change = seconds / expected - 1
+        status = 'REGRESSION' if change > tolerance else 'ok'
+        rows.append((name, expected, seconds, change, status))
+    return rows
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def format_table(rows):
+    width = max([len('benchmark')] + [len(row[0]) for row in rows])
+    lines = [f"{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  {'change':>8}  status"]
+    for name, expected, seconds, change, status in rows:
+        change_text = f"{change * 100:+.1f}%" if change is not None else '-'
+        lines.append(f"{name:<{width}}  {format_seconds(expected):>10}  {format_seconds(seconds):>10}  "
+                     f"{change_text:>8}  {status}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="Run the benchmarks and compare them with the stored baseline.")
+    parser.add_argument('-k', '--filter', default=None, help="Only run benchmarks whose name matches this regex")
+    parser.add_argument('--full', action='store_true', help="Include the large (100k-1M file) benchmarks")
+    parser.add_argument('--update', action='store_true', help="Store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown before a benchmark fails (0.5 = 50%%)")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Baseline file")
+    parser.add_argument('--json', default=None, help="Also write the results to this file")
+    parser.add_argument('--list', action='store_true', help="List the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # The code under test logs at INFO/DEBUG on every call
+    logging.disable(logging.INFO)
+
+    from benchmarks import fixtures
+    from benchmarks import bench_processes, bench_cache, bench_history, bench_payload  # noqa: F401
+
+    pattern = re.compile(args.filter) if args.filter else None
+    selected = [bench for bench in BENCHMARKS
+                if (args.full or not bench.full) and (pattern is None or pattern.search(bench.name))]
+    if args.list:
+        for bench in selected:
+            print(bench.name)
+        return 0
+
+    results = {}
+    try:
+        calibration = calibrate()
+        for bench in selected:
+            results[bench.name] = bench.measure()
+            print(f"{bench.name}: {format_seconds(results[bench.name])}", file=sys.stderr)
+    finally:
+        fixtures.cleanup()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'calibration': calibration, 'benchmarks': results}, f, indent=2)
+
+    if args.update:
+        save_baseline(results, calibration, args.baseline)
+        print(f"Baseline updated with {len(results)} benchmark(s): {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    rows = compare(results, calibration, baseline, args.tolerance)
+    print(format_table(rows))
+    regressions = [row[0] for row in rows if row[4] == 'REGRESSION']
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) more than {args.tolerance:.0%} slower than the baseline: "
+              f"{', '.join(regressions)}")
+        return 1
+    if baseline is None:
+        print("\nNo baseline stored yet; run with --update to create one.")
+    return 0
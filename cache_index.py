@@ -0,0 +1,151 @@
+import os
+import json
+import logging
+import threading
+import time
+import zlib
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Configuration file paths
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
+CACHE_INDEX_FILE = os.path.join(CONFIG_DIR, 'cache_index.json')
+
+# Ensure config directory exists
+os.makedirs(CONFIG_DIR, exist_ok=True)
+
+# Bump when the on-disk layout changes; older files are ignored
+CACHE_INDEX_VERSION = 1
+
+# Directories are re-listed at least this often even if their mtime is
+# unchanged, because rewriting a file in place does not touch the mtime of
+# the directory that contains it.
+REVALIDATE_SECONDS = 3600
+
+# Each directory's revalidation age is spread over REVALIDATE_SECONDS
+# +/- this fraction, so directories listed in the same pass do not all come
+# due on the same later scan
+REVALIDATE_JITTER = 0.5
+
+
+class CacheIndex:
+    """
+    Persistent index of per-directory size and file count aggregates.
+    A directory is only re-listed when its mtime changed since the previous
+    scan; otherwise the stored totals of its own files are reused and only
+    its subdirectories are checked.
+    """
+
+    def __init__(self, index_file=CACHE_INDEX_FILE, revalidate_seconds=REVALIDATE_SECONDS):
+        self.index_file = index_file
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        self._dirs = None  # path -> {'mtime', 'scanned', 'size', 'count', 'subdirs'}
+        self._dirty = False
+
+    def _ensure_loaded(self):
+        if self._dirs is not None:
+            return
+        self._dirs = {}
+        try:
+            if os.path.exists(self.index_file):
+                with open(self.index_file, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == CACHE_INDEX_VERSION:
+                    self._dirs = data.get('dirs', {})
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache index {self.index_file}: {str(e)}")
+
+    def save(self):
+        """Write the index to disk if it changed since the last save."""
+        with self._lock:
+            if not self._dirty or self._dirs is None:
+                return True
+            tmp_file = f"{self.index_file}.tmp"
+            try:
+                with open(tmp_file, 'w') as f:
+                    json.dump({'version': CACHE_INDEX_VERSION, 'dirs': self._dirs}, f)
+                os.replace(tmp_file, self.index_file)
+                self._dirty = False
+                return True
+            except Exception as e:
+                logger.exception("Error saving cache index")
+                return False
+
+    def _list_dir(self, path, mtime, now):
+        """List one directory, returning its fresh index entry."""
+        size = 0
+        count = 0
+        subdirs = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    else:
+                        size += entry.stat(follow_symlinks=False).st_size
+                        count += 1
+                except (OSError, PermissionError):
+                    continue
+        return {'mtime': mtime, 'scanned': now, 'size': size, 'count': count, 'subdirs': subdirs}
+
+    def _revalidate_after(self, path):
+        """Seconds after which path is re-listed even if unchanged; fixed per path."""
+        spread = (zlib.crc32(os.fsencode(path)) % 1000) / 1000
+        return self.revalidate_seconds * (1 - REVALIDATE_JITTER + 2 * REVALIDATE_JITTER * spread)
+
+    def scan(self, root):
+        """
+        Return (total_size, file_count) for everything below root.
+        Only directories whose mtime changed, or that are due for
+        revalidation, are re-listed.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            now = time.time()
+            total_size = 0
+            file_count = 0
+            seen = set()
+            stack = [root]
+
+            while stack:
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except (OSError, PermissionError):
+                    continue
+                seen.add(path)
+
+                entry = self._dirs.get(path)
+                if entry is None or entry['mtime'] != mtime \
+                        or now - entry['scanned'] > self._revalidate_after(path):
+                    try:
+                        entry = self._list_dir(path, mtime, now)
+                    except (OSError, PermissionError):
+                        continue
+                    self._dirs[path] = entry
+                    self._dirty = True
+
+                total_size += entry['size']
+                file_count += entry['count']
+                stack.extend(os.path.join(path, name) for name in entry['subdirs'])
+
+            # Drop directories below root that no longer exist
+            self._prune(root, seen)
+
+            return total_size, file_count
+
+    def _prune(self, root, keep):
+        prefix = os.path.join(root, '')
+        stale = [path for path in self._dirs if (path == root or path.startswith(prefix)) and path not in keep]
+        for path in stale:
+            del self._dirs[path]
+        if stale:
+            self._dirty = True
+
+    def invalidate(self, root):
+        """Forget everything indexed below root so the next scan re-lists it."""
+        with self._lock:
+            self._ensure_loaded()
+            self._prune(root, set())
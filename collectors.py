@@ -0,0 +1,128 @@
+import time
+import logging
+import threading
+from datetime import datetime
+from apscheduler.executors.pool import ThreadPoolExecutor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# APScheduler executor that slow collectors run on, separate from the
+# default executor used by the metrics tick
+COLLECTOR_EXECUTOR = 'collectors'
+COLLECTOR_WORKERS = 2
+
+# A collector that overruns its cost budget has its interval doubled, up to
+# this multiple of the configured interval, until a run fits the budget again
+MAX_BACKOFF = 8
+
+
+class Collector:
+    """
+    A slow collector with its own interval and cost budget (seconds per run).
+    The latest result is cached in `value` so readers never wait for a run.
+    """
+
+    def __init__(self, name, func, interval, budget, default=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.budget = budget
+        self.value = default
+        self.backoff = 1
+        self.last_run = None
+        self.last_duration = None
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Run the collector once; returns True if the result is within budget."""
+        with self._lock:
+            start = time.monotonic()
+            try:
+                value = self.func()
+            except Exception:
+                logger.exception(f"Error running collector {self.name}")
+                self.errors += 1
+                value = None
+            duration = time.monotonic() - start
+
+            if value is not None:
+                self.value = value
+            self.runs += 1
+            self.last_run = time.time()
+            self.last_duration = duration
+
+            if duration > self.budget:
+                self.overruns += 1
+                logger.warning(f"Collector {self.name} took {duration:.2f}s (budget {self.budget}s)")
+                return False
+            return True
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'interval': self.interval * self.backoff,
+            'budget': self.budget,
+            'last_run': self.last_run,
+            'last_duration': self.last_duration,
+            'runs': self.runs,
+            'errors': self.errors,
+            'overruns': self.overruns
+        }
+
+
+class CollectorScheduler:
+    """
+    Runs registered collectors as separate APScheduler interval jobs on a
+    dedicated executor, so slow scans never delay the metrics tick.
+    """
+
+    def __init__(self, scheduler, executor=COLLECTOR_EXECUTOR, workers=COLLECTOR_WORKERS):
+        self.scheduler = scheduler
+        self.executor = executor
+        self.collectors = {}
+        scheduler.add_executor(ThreadPoolExecutor(workers), alias=executor)
+
+    def register(self, name, func, interval, budget, default=None):
+        """Register a collector; it is scheduled by start()."""
+        collector = Collector(name, func, interval, budget, default)
+        self.collectors[name] = collector
+        return collector
+
+    def _job_id(self, name):
+        return f"collector:{name}"
+
+    def start(self):
+        """Add a job per collector, each running once right away."""
+        for name, collector in self.collectors.items():
+            if self.scheduler.get_job(self._job_id(name)) is None:
+                self.scheduler.add_job(self._run, 'interval', args=(name,), seconds=collector.interval,
+                                       id=self._job_id(name), executor=self.executor,
+                                       next_run_time=datetime.now(self.scheduler.timezone),
+                                       max_instances=1, coalesce=True)
+
+    def _run(self, name):
+        collector = self.collectors[name]
+        within_budget = collector.run()
+        backoff = 1 if within_budget else min(collector.backoff * 2, MAX_BACKOFF)
+        if backoff != collector.backoff:
+            collector.backoff = backoff
+            job = self.scheduler.get_job(self._job_id(name))
+            if job is not None:
+                job.reschedule('interval', seconds=collector.interval * backoff)
+
+    def value(self, name):
+        """Latest result of a collector (its default until the first run)."""
+        return self.collectors[name].value
+
+    def run_now(self, name):
+        """Run a collector in the calling thread and return its fresh result."""
+        self._run(name)
+        return self.value(name)
+
+    def status(self):
+        return [collector.as_dict() for collector in self.collectors.values()]
+
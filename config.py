@@ -1,6 +1,7 @@
 import os
 import json
 import logging
+import threading
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -8,6 +9,8 @@ logger = logging.getLogger(__name__)
 # Configuration file paths
 CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
 ALERT_SETTINGS_FILE = os.path.join(CONFIG_DIR, 'alert_settings.json')
+EMAIL_CONFIG_FILE = os.path.join(CONFIG_DIR, 'email_config.json')
+DISCORD_CONFIG_FILE = os.path.join(CONFIG_DIR, 'discord_config.json')
 
 # Ensure config directory exists
 os.makedirs(CONFIG_DIR, exist_ok=True)
@@ -19,31 +22,124 @@ def get_default_alert_settings():
         'cpu_threshold': 80.0,
         'memory_threshold': 80.0,
         'disk_threshold': 85.0,
+        # Firing alerts resolve once the value drops to the clear threshold
+        'cpu_clear_threshold': 70.0,
+        'memory_clear_threshold': 70.0,
+        'disk_clear_threshold': 80.0,
+        'alert_for_seconds': 60,           # must stay above threshold this long
+        'alert_renotify_interval': 3600,   # seconds between repeats, 0 = never
+        'alert_notify_resolved': True,
+        'alert_digest_window': 10,         # seconds to group alerts per channel, 0 = off
+        # Expression rules, e.g. {'name': 'db memory', 'expr': "proc['postgres'].rss > 8GB"}
+        'alert_rules': [],
         'email_alerts': False,
         'discord_alerts': False
     }
 
+def get_default_email_config():
+    """Get default (empty) email configuration."""
+    return {
+        'email_from': '',
+        'email_to': '',
+        'smtp_server': 'smtp.gmail.com',
+        'smtp_port': 587,
+        'smtp_username': '',
+        'smtp_password': '',
+        'smtp_starttls': True  # off for a plain local relay
+    }
+
+def get_default_discord_config():
+    """Get default (empty) Discord webhook configuration."""
+    return {'webhook_url': ''}
+
+
+class SettingsFile:
+    """
+    A JSON settings file cached in memory.
+    get() serves the cached values and only re-reads the file after its
+    mtime or size changed; save() writes a temporary file and renames it over
+    the original, so readers never see a partially written file.
+    """
+
+    def __init__(self, path, defaults=dict):
+        self.path = path
+        self.defaults = defaults
+        self._lock = threading.Lock()
+        self._values = None
+        self._stamp = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _load(self):
+        values = self.defaults()
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    values.update(json.load(f))
+        except Exception as e:
+            logger.exception(f"Error loading settings from {self.path}")
+        return values
+
+    def get(self):
+        """
+        Return the current settings (file values over the defaults).
+        The same dict is returned until the file changes; do not modify it.
+        """
+        stamp = self._stat()
+        with self._lock:
+            if self._values is None or stamp != self._stamp:
+                self._values = self._load()
+                self._stamp = stamp
+            return self._values
+
+    def save(self, values):
+        """Atomically replace the file with values."""
+        with self._lock:
+            tmp_file = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_file, 'w') as f:
+                    json.dump(values, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.path)
+                merged = self.defaults()
+                merged.update(values)
+                self._values = merged
+                self._stamp = self._stat()
+                return True
+            except Exception as e:
+                logger.exception(f"Error saving settings to {self.path}")
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
+                return False
+
+
+# Settings registry, keyed by name
+settings_files = {
+    'alert': SettingsFile(ALERT_SETTINGS_FILE, get_default_alert_settings),
+    'email': SettingsFile(EMAIL_CONFIG_FILE, get_default_email_config),
+    'discord': SettingsFile(DISCORD_CONFIG_FILE, get_default_discord_config)
+}
+
+def get_settings(name):
+    """Get the cached settings registered under name (do not modify the result)."""
+    return settings_files[name].get()
+
+def save_settings(name, values):
+    """Save the settings registered under name."""
+    return settings_files[name].save(values)
+
 def load_alert_settings():
-    """Load alert settings from file."""
-    try:
-        if os.path.exists(ALERT_SETTINGS_FILE):
-            with open(ALERT_SETTINGS_FILE, 'r') as f:
-                return json.load(f)
-        else:
-            # Return default settings
-            default_settings = get_default_alert_settings()
-            save_alert_settings(default_settings)
-            return default_settings
-    except Exception as e:
-        logger.exception("Error loading alert settings")
-        return get_default_alert_settings()
+    """Load alert settings."""
+    return get_settings('alert')
 
 def save_alert_settings(settings):
     """Save alert settings to file."""
-    try:
-        with open(ALERT_SETTINGS_FILE, 'w') as f:
-            json.dump(settings, f, indent=4)
-        return True
-    except Exception as e:
-        logger.exception("Error saving alert settings")
-        return False
+    return save_settings('alert', settings)
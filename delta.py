@@ -0,0 +1,111 @@
+import time
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Payload lists diffed row by row, with the field identifying a row
+KEYED_ROWS = {
+    'processes': 'pid',
+    'disk_info': 'mountpoint'
+}
+
+# Payload section holding the chart history (lists of points)
+HISTORY_KEY = 'historical'
+
+
+class DeltaEncoder:
+    """
+    Turns successive full dashboard payloads into small deltas.
+    Clients receive one full payload (with its sequence number) on connect
+    and then apply each delta in order. A delta only carries top-level
+    sections that changed, changed/removed rows of keyed tables and the
+    history points added since the previous payload. A client that misses a
+    sequence number asks for a new full payload.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.updated_at = None
+        self._last = None
+        self._lock = threading.Lock()
+
+    def age(self):
+        """Seconds since the latest payload was stored, or None if there is none."""
+        if self.updated_at is None:
+            return None
+        return time.monotonic() - self.updated_at
+
+    def full(self):
+        """Return the latest full payload with its sequence number, or None."""
+        with self._lock:
+            if self._last is None:
+                return None
+            return dict(self._last, seq=self.seq)
+
+    def update(self, payload, history_added=None):
+        """
+        Store a new full payload and return the delta from the previous one.
+        history_added is the number of points appended to the history window
+        since the previous payload; if unknown the whole window is resent.
+        """
+        with self._lock:
+            previous = self._last
+            self.seq += 1
+            self.updated_at = time.monotonic()
+            # Payload sections are rebuilt every tick, never mutated in place
+            self._last = dict(payload)
+
+            delta = {'seq': self.seq, 'set': {}, 'rows': {}}
+            for key, value in payload.items():
+                old = previous.get(key) if previous is not None else None
+                if previous is None or key not in previous:
+                    delta['set'][key] = value
+                elif key in KEYED_ROWS:
+                    rows = _diff_rows(old, value, KEYED_ROWS[key])
+                    if rows is not None:
+                        delta['rows'][key] = rows
+                elif key == HISTORY_KEY:
+                    delta['history'] = _diff_history(value, history_added)
+                elif value != old:
+                    delta['set'][key] = value
+
+            if previous is not None:
+                removed = [key for key in previous if key not in payload]
+                if removed:
+                    delta['unset'] = removed
+            return delta
+
+
+def _diff_rows(old, new, key_field):
+    """
+    Diff two lists of dicts identified by key_field.
+    Returns {'upsert': [...], 'remove': [...], 'order': [...]} or None if equal.
+    """
+    if old == new:
+        return None
+    old_rows = {row[key_field]: row for row in old or []}
+    new_keys = [row[key_field] for row in new]
+    upsert = [row for row in new if old_rows.get(row[key_field]) != row]
+    remove = [key for key in old_rows if key not in set(new_keys)]
+    return {'upsert': upsert, 'remove': remove, 'order': new_keys}
+
+
+def _diff_history(new, added):
+    """
+    Return the history points appended since the previous payload as
+    {'append': {...}, 'max_points': n}, with the same nesting as the history
+    section, or {'replace': new} if the number of new points is unknown.
+    """
+    timestamps = new.get('timestamps') or []
+    if added is None or added > len(timestamps):
+        return {'replace': new}
+    return {'append': _tail(new, added), 'max_points': len(timestamps)}
+
+
+def _tail(section, count):
+    """Last `count` points of every list in a (nested) history section."""
+    if isinstance(section, dict):
+        return {key: _tail(value, count) for key, value in section.items()}
+    return section[len(section) - count:] if count else []
@@ -0,0 +1,174 @@
+import gzip
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Prefix of every exported metric family
+METRIC_PREFIX = 'pchealth'
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Counters exported per network direction: (counter field, family suffix, help)
+NETWORK_FAMILIES = (
+    ('bytes_sent', 'network_transmit_bytes', 'Bytes sent'),
+    ('bytes_recv', 'network_receive_bytes', 'Bytes received'),
+    ('packets_sent', 'network_transmit_packets', 'Packets sent'),
+    ('packets_recv', 'network_receive_packets', 'Packets received'),
+    ('errout', 'network_transmit_errors', 'Errors while sending'),
+    ('errin', 'network_receive_errors', 'Errors while receiving'),
+    ('dropout', 'network_transmit_drops', 'Outgoing packets dropped'),
+    ('dropin', 'network_receive_drops', 'Incoming packets dropped')
+)
+
+# Disk I/O statistics exported per device: (stats field, family suffix, help)
+DISK_IO_FAMILIES = (
+    ('read_bytes', 'disk_read_bytes_per_second', 'Bytes read per second'),
+    ('write_bytes', 'disk_write_bytes_per_second', 'Bytes written per second'),
+    ('read_iops', 'disk_reads_per_second', 'Read requests completed per second'),
+    ('write_iops', 'disk_writes_per_second', 'Write requests completed per second'),
+    ('read_latency', 'disk_read_latency_milliseconds', 'Average read latency'),
+    ('write_latency', 'disk_write_latency_milliseconds', 'Average write latency'),
+    ('busy', 'disk_busy_percent', 'Percentage of time the device was busy')
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class _Writer:
+    """Accumulates OpenMetrics families and samples as text lines."""
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, metric_type, help_text):
+        name = f"{METRIC_PREFIX}_{name}"
+        self.lines.append(f"# TYPE {name} {metric_type}")
+        self.lines.append(f"# HELP {name} {help_text}")
+        return name
+
+    def sample(self, name, value, labels=None, suffix=''):
+        if value is None:
+            return
+        if labels:
+            label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+            self.lines.append(f"{name}{suffix}{{{label_text}}} {_number(value)}")
+        else:
+            self.lines.append(f"{name}{suffix} {_number(value)}")
+
+    def gauge(self, name, help_text, value, labels=None):
+        self.sample(self.family(name, 'gauge', help_text), value, labels)
+
+    def render(self):
+        self.lines.append('# EOF')
+        return '\n'.join(self.lines) + '\n'
+
+
+def render_snapshot(snapshot, disk_info=None, cache_info=None):
+    """Render a monitor.Snapshot (plus slow collector results) as OpenMetrics text."""
+    writer = _Writer()
+
+    info = snapshot.system_info
+    name = writer.family('system', 'info', 'Operating system and machine')
+    writer.sample(name, 1, {key: info.get(key, '') for key in ('system', 'release', 'machine', 'node')},
+                  suffix='_info')
+    writer.gauge('last_collection_timestamp_seconds', 'Time of the snapshot these metrics come from',
+                 snapshot.timestamp.timestamp())
+
+    # CPU
+    writer.gauge('cpu_percent', 'CPU utilisation since the previous sample', snapshot.cpu_percent)
+    name = writer.family('cpu_core_percent', 'gauge', 'Per-core CPU utilisation since the previous sample')
+    for core, percent in enumerate(snapshot.cpu_info.get('per_core', [])):
+        writer.sample(name, percent, {'core': core})
+    writer.gauge('cpu_count', 'Logical CPUs', snapshot.cpu_info.get('count'))
+    writer.gauge('cpu_frequency_mhz', 'Current CPU frequency', snapshot.cpu_info.get('frequency'))
+
+    # Memory
+    memory = snapshot.memory
+    writer.gauge('memory_total_bytes', 'Total physical memory', memory['total_bytes'])
+    writer.gauge('memory_used_bytes', 'Used physical memory', memory['used_bytes'])
+    writer.gauge('memory_available_bytes', 'Available physical memory', memory['available_bytes'])
+    writer.gauge('memory_percent', 'Physical memory in use', memory['percent'])
+
+    # Partitions
+    partitions = disk_info or []
+    for field, suffix, help_text in (('total_bytes', 'size_bytes', 'Partition size'),
+                                     ('used_bytes', 'used_bytes', 'Space used on the partition'),
+                                     ('free_bytes', 'free_bytes', 'Space free on the partition')):
+        name = writer.family(f'filesystem_{suffix}', 'gauge', help_text)
+        for partition in partitions:
+            writer.sample(name, partition[field], _partition_labels(partition))
+    name = writer.family('filesystem_used_percent', 'gauge', 'Partition space in use')
+    for partition in partitions:
+        writer.sample(name, partition['percent'], _partition_labels(partition))
+
+    # Network counters since boot, per interface
+    interfaces = snapshot.network.get('interface_counters', {})
+    for field, suffix, help_text in NETWORK_FAMILIES:
+        name = writer.family(suffix, 'counter', help_text)
+        for nic, counters in interfaces.items():
+            writer.sample(name, counters[field], {'interface': nic}, suffix='_total')
+
+    # Disk I/O, per device
+    for field, suffix, help_text in DISK_IO_FAMILIES:
+        name = writer.family(suffix, 'gauge', help_text)
+        for disk, stats in snapshot.disk_io.items():
+            writer.sample(name, stats.get(field), {'disk': disk})
+
+    # Top processes
+    for field, suffix, help_text in (('cpu_percent', 'process_cpu_percent', 'CPU utilisation of a top process'),
+                                     ('memory_percent', 'process_memory_percent', 'Memory share of a top process')):
+        name = writer.family(suffix, 'gauge', help_text)
+        for process in snapshot.processes:
+            writer.sample(name, process[field], {'pid': process['pid'], 'name': process['name']})
+
+    # Cache and temp files
+    if cache_info:
+        writer.gauge('cache_size_bytes', 'Size of cache and temp files', cache_info['total_size'])
+        writer.gauge('cache_files', 'Number of cache and temp files', cache_info['file_count'])
+
+    return writer.render()
+
+
+def _partition_labels(partition):
+    return {'device': partition['device'], 'mountpoint': partition['mountpoint'], 'fstype': partition['fstype']}
+
+
+class MetricsExposition:
+    """
+    Holds the /metrics response rendered once per tick, both plain and
+    gzip-compressed, so scrapes only copy bytes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._body = None
+        self._gzipped = None
+
+    def update(self, snapshot, disk_info=None, cache_info=None):
+        """Render a new snapshot."""
+        try:
+            body = render_snapshot(snapshot, disk_info, cache_info).encode('utf-8')
+        except Exception:
+            logger.exception("Error rendering metrics")
+            return
+        gzipped = gzip.compress(body, compresslevel=5)
+        with self._lock:
+            self._body = body
+            self._gzipped = gzipped
+
+    def body(self, compressed=False):
+        """Latest rendered output (None before the first tick)."""
+        with self._lock:
+            return self._gzipped if compressed else self._body
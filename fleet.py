@@ -0,0 +1,206 @@
+import re
+import time
+import heapq
+import fnmatch
+import logging
+import operator
+import threading
+
+from history import parse_duration
+from rule_engine import RunningWindow
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Series with windowed aggregates per host; every other series only keeps
+# its latest value
+INDEXED_SERIES = ('cpu', 'memory', 'disk', 'net.bytes_sent', 'net.bytes_recv')
+
+# Aggregation windows kept for the indexed series (seconds)
+FLEET_WINDOWS = (300, 900, 3600)
+
+# Aggregations accepted by FleetIndex.top(); 'last' uses the latest value
+FLEET_AGGREGATIONS = ('last', 'avg', 'min', 'max')
+
+# Upper bound on hosts returned by one query
+MAX_FLEET_LIMIT = 1000
+
+_OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+# "memory > 80", "disk[*].percent >= 90" or "avg(cpu, 15m) > 75"
+_FILTER_PATTERN = re.compile(
+    r'^\s*(?:(?P<agg>avg|min|max)\(\s*(?P<wseries>[^,()]+?)\s*,\s*(?P<window>[\w.]+)\s*\)|(?P<series>[^<>=!]+?))'
+    r'\s*(?P<op>>=|<=|==|!=|>|<)\s*(?P<value>-?\d+(?:\.\d+)?)\s*$'
+)
+
+
+class HostIndex:
+    """Latest values and running window aggregates of one host."""
+
+    def __init__(self, host, windows, indexed_series):
+        self.host = host
+        self.latest = {}
+        self.timestamp = None
+        self.windows = {(name, seconds): RunningWindow(seconds) for name in indexed_series for seconds in windows}
+        self._names_version = 0
+        self._matches = {}  # glob pattern -> (names version, matching series)
+
+    def update(self, timestamp, values):
+        if any(name not in self.latest for name in values):
+            self._names_version += 1
+        self.latest.update(values)
+        self.timestamp = timestamp
+        for (name, _), window in self.windows.items():
+            value = values.get(name)
+            if value is not None:
+                window.add(timestamp, value)
+
+    def matching(self, pattern):
+        """Series names matching a glob pattern such as disk[*].percent (cached)."""
+        cached = self._matches.get(pattern)
+        if cached is not None and cached[0] == self._names_version:
+            return cached[1]
+        # Square brackets are part of series names, not character classes
+        regex = re.compile(fnmatch.translate(pattern.replace('[', '[[]')))
+        names = [name for name in self.latest if regex.match(name)]
+        self._matches[pattern] = (self._names_version, names)
+        return names
+
+    def value(self, series, agg='last', window=None, now=None):
+        """
+        Latest value or windowed aggregate of a series, or None. Windows only
+        move when a sample arrives, so pass the query time as `now` to drop
+        what has aged out since (None once the host has been silent longer
+        than the window).
+        """
+        if agg == 'last':
+            return self.latest.get(series)
+        running = self.windows.get((series, window))
+        if running is None:
+            return None
+        if now is not None:
+            running.expire(now)
+        return running.value(agg)
+
+    def summary(self):
+        return {
+            'host': self.host,
+            'timestamp': self.timestamp,
+            'cpu': self.latest.get('cpu'),
+            'memory': self.latest.get('memory'),
+            'disk': self.latest.get('disk')
+        }
+
+
+class FleetIndex:
+    """
+    Per-host latest-value and windowed-aggregate indexes for the fleet.
+    Updated incrementally as samples are ingested, so a top-K or filter
+    query costs one O(1) lookup per host instead of a history scan.
+    """
+
+    def __init__(self, windows=FLEET_WINDOWS, indexed_series=INDEXED_SERIES):
+        self.windows = tuple(windows)
+        self.indexed_series = tuple(indexed_series)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._hosts)
+
+    def update(self, host, timestamp, values):
+        """Index one sample of a host."""
+        with self._lock:
+            index = self._hosts.get(host)
+            if index is None:
+                index = self._hosts[host] = HostIndex(host, self.windows, self.indexed_series)
+            index.update(timestamp, values)
+
+    def remove(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def _window(self, text):
+        seconds = parse_duration(text)
+        if seconds not in self.windows:
+            allowed = ', '.join(f"{int(window)}s" for window in self.windows)
+            raise ValueError(f"Unsupported window {text!r}; indexed windows are {allowed}")
+        return seconds
+
+    def _check_series(self, series, agg):
+        if agg != 'last' and series not in self.indexed_series:
+            raise ValueError(f"{series!r} has no windowed index; indexed series are {', '.join(self.indexed_series)}")
+
+    def parse_filter(self, text, now=None):
+        """
+        Compile a filter such as 'memory > 80', 'disk[*].percent > 90' (true if
+        any matching series is) or 'avg(cpu, 15m) > 75' into a predicate.
+        Windowed filters are evaluated as of `now` (see HostIndex.value).
+        """
+        match = _FILTER_PATTERN.match(text)
+        if not match:
+            raise ValueError(f"Invalid filter: {text!r}")
+        compare = _OPERATORS[match.group('op')]
+        threshold = float(match.group('value'))
+
+        if match.group('agg'):
+            agg, series = match.group('agg'), match.group('wseries')
+            window = self._window(match.group('window'))
+            self._check_series(series, agg)
+
+            def predicate(index):
+                value = index.value(series, agg, window, now)
+                return value is not None and compare(value, threshold)
+            return predicate
+
+        series = match.group('series').strip()
+        if '*' in series:
+            return lambda index: any(compare(index.latest[name], threshold) for name in index.matching(series))
+        return lambda index: series in index.latest and compare(index.latest[series], threshold)
+
+    def top(self, metric, agg='last', window=None, limit=10, filters=(), ascending=False, max_age=None):
+        """
+        Hosts ranked by `agg` of `metric` over `window`, keeping only hosts
+        that pass every filter (and reported within max_age seconds). Windows
+        are aggregated as of now, so hosts with no sample inside the window
+        are left out of windowed rankings.
+        Returns (total matching hosts, [{'host', 'value', ...summary}]).
+        """
+        if agg not in FLEET_AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {agg}")
+        seconds = None
+        if agg != 'last':
+            if window is None:
+                raise ValueError("window is required for windowed aggregations")
+            seconds = self._window(window)
+        self._check_series(metric, agg)
+        now = time.time()
+        predicates = [self.parse_filter(text, now) for text in filters]
+        limit = max(1, min(int(limit), MAX_FLEET_LIMIT))
+        oldest = now - max_age if max_age is not None else None
+
+        with self._lock:
+            candidates = []
+            for index in self._hosts.values():
+                if oldest is not None and (index.timestamp is None or index.timestamp < oldest):
+                    continue
+                if not all(predicate(index) for predicate in predicates):
+                    continue
+                value = index.value(metric, agg, seconds, now)
+                if value is not None:
+                    candidates.append((value, index))
+            select = heapq.nsmallest if ascending else heapq.nlargest
+            ranked = select(limit, candidates, key=lambda candidate: candidate[0])
+            return len(candidates), [dict(index.summary(), value=value) for value, index in ranked]
+
+    def hosts(self):
+        """Summaries of every indexed host."""
+        with self._lock:
+            return [index.summary() for index in self._hosts.values()]
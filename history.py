@@ -0,0 +1,657 @@
+import os
+import math
+import mmap
+import time
+import bisect
+import struct
+import logging
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote, unquote
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Default number of raw samples kept per series
+DEFAULT_CAPACITY = 1440
+
+# Backing arrays start this small and double until they reach capacity
+INITIAL_ALLOCATION = 64
+
+# Downsampled tiers kept for every series, as (bucket seconds, buckets kept)
+DEFAULT_TIERS = (
+    (60, 7 * 24 * 60),  # 1 minute for 7 days
+    (3600, 365 * 24)    # 1 hour for a year
+)
+
+# Aggregates kept per rollup bucket
+ROLLUP_COLUMNS = ('min', 'max', 'avg', 'last', 'count')
+
+# Upper bound on points returned by HistoryStore.read()
+DEFAULT_MAX_POINTS = 500
+
+# Aggregations accepted by HistoryStore.query(), besides percentiles such as 'p95'
+QUERY_AGGREGATIONS = ('avg', 'min', 'max', 'last')
+
+# Upper bound on points returned by HistoryStore.query()
+MAX_QUERY_POINTS = 10000
+
+# Duration suffixes accepted by parse_duration()
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+# On-disk sample: little-endian (timestamp, value) doubles
+SEGMENT_RECORD = struct.Struct('<dd')
+SEGMENT_SUFFIX = '.seg'
+
+# Days of on-disk segments kept per series
+DEFAULT_RETENTION_DAYS = 30
+
+# Segment writers of series that stopped reporting are closed after this long
+WRITER_IDLE_SECONDS = 86400
+
+# Seconds between sweeps that close idle writers and expire old segments
+MAINTENANCE_INTERVAL = 3600
+
+
+class RingBuffer:
+    """
+    Fixed-capacity ring buffer of timestamped samples backed by array('d').
+    Every sample has an epoch timestamp and one float per column. Appends are
+    O(1), and reads return memoryviews over copies of the requested window:
+    a view into the backing arrays would be overwritten once the buffer
+    wraps. Each column is copied with one or two array slices.
+    """
+
+    def __init__(self, capacity, columns=('value',)):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._size = 0
+        self._start = 0  # physical index of the oldest sample
+        allocation = min(capacity, INITIAL_ALLOCATION)
+        self._arrays = {name: _zeros(allocation) for name in ('timestamp',) + self.columns}
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self):
+        allocation = min(self.capacity, len(self._arrays['timestamp']) * 2)
+        for name, old in self._arrays.items():
+            new = _zeros(allocation)
+            new[:self._size] = old[:self._size]
+            self._arrays[name] = new
+
+    def append(self, timestamp, *values):
+        """Add a sample, overwriting the oldest one once the buffer is full."""
+        if len(values) != len(self.columns):
+            raise ValueError(f"expected {len(self.columns)} values, got {len(values)}")
+
+        if self._size < self.capacity:
+            if self._size == len(self._arrays['timestamp']):
+                self._grow()
+            index = self._size
+            self._size += 1
+        else:
+            index = self._start
+            self._start = (self._start + 1) % self.capacity
+
+        self._arrays['timestamp'][index] = timestamp
+        for name, value in zip(self.columns, values):
+            self._arrays[name][index] = value
+
+    def update_last(self, *values):
+        """Overwrite the columns of the newest sample in place."""
+        if not self._size:
+            raise IndexError("update_last() on an empty buffer")
+        index = self._physical(self._size - 1)
+        for name, value in zip(self.columns, values):
+            self._arrays[name][index] = value
+
+    def _physical(self, index):
+        return (self._start + index) % self.capacity if self._size == self.capacity else index
+
+    def _column_slice(self, name, first, last):
+        """Copy [first, last) in logical order."""
+        buf = self._arrays[name]
+        if first >= last:
+            return memoryview(array('d'))
+        start = self._physical(first)
+        end = start + (last - first)
+        if end <= len(buf):
+            return memoryview(buf[start:end])
+        return memoryview(buf[start:] + buf[:end - len(buf)])
+
+    def slice(self, first, last):
+        """Return {column: values} for logical samples [first, last), oldest first."""
+        first = max(first, 0)
+        last = min(last, self._size)
+        return {name: self._column_slice(name, first, last) for name in self._arrays}
+
+    def timestamp_at(self, index):
+        return self._arrays['timestamp'][self._physical(index)]
+
+    def bisect(self, timestamp):
+        """Logical index of the first sample at or after timestamp."""
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp_at(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def last(self, count=None):
+        """Return the newest `count` samples (all if None)."""
+        count = self._size if count is None else min(count, self._size)
+        return self.slice(self._size - count, self._size)
+
+    def between(self, start, end):
+        """Return the samples with start <= timestamp < end."""
+        return self.slice(self.bisect(start), self.bisect(end))
+
+    def latest(self):
+        """Return {column: value} for the newest sample, or None if empty."""
+        if not self._size:
+            return None
+        index = self._physical(self._size - 1)
+        return {name: buf[index] for name, buf in self._arrays.items()}
+
+
+def _zeros(length):
+    return array('d', bytes(8 * length))
+
+
+def parse_duration(text):
+    """Parse a duration such as '30', '30s', '5m', '1h' or '7d' into seconds."""
+    text = str(text).strip().lower()
+    unit = DURATION_UNITS.get(text[-1:])
+    try:
+        seconds = float(text[:-1]) * unit if unit else float(text)
+    except ValueError:
+        raise ValueError(f"Invalid duration: {text!r}") from None
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError(f"Invalid duration: {text!r}")
+    return seconds
+
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(int(-(-percent * len(ordered) // 100)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _aggregate(columns, resolution, origin, step, points, agg):
+    """
+    Fold samples (resolution None) or rollup buckets into `points` buckets of
+    `step` seconds starting at origin. Empty buckets are None.
+    """
+    timestamps = columns['timestamp']
+    raw = resolution is None
+    percent = None if agg in QUERY_AGGREGATIONS else float(agg[1:])
+    state = [None] * points
+
+    for index in range(len(timestamps)):
+        slot = int((timestamps[index] - origin) // step)
+        if not 0 <= slot < points:
+            continue
+        if percent is not None:
+            value = columns['value'][index] if raw else columns['max'][index]
+            if state[slot] is None:
+                state[slot] = []
+            state[slot].append(value)
+        elif agg == 'avg':
+            value = columns['value'][index] if raw else columns['avg'][index]
+            count = 1 if raw else columns['count'][index]
+            total, weight = state[slot] or (0.0, 0)
+            state[slot] = (total + value * count, weight + count)
+        else:
+            value = columns['value'][index] if raw else columns[agg][index]
+            current = state[slot]
+            if current is None or agg == 'last':
+                state[slot] = value
+            elif agg == 'max':
+                state[slot] = max(current, value)
+            else:
+                state[slot] = min(current, value)
+
+    if percent is not None:
+        return [_percentile(values, percent) if values else None for values in state]
+    if agg == 'avg':
+        return [total / weight if weight else None for total, weight in (item or (0.0, 0) for item in state)]
+    return state
+
+
+class Rollup:
+    """
+    Downsampled tier of one series.
+    Samples are folded into fixed-width buckets holding min, max, avg, last
+    and count; the newest bucket is updated in place until a sample for a
+    later bucket arrives.
+    """
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.buffer = RingBuffer(capacity, ROLLUP_COLUMNS)
+
+    def add(self, timestamp, value):
+        bucket = timestamp - timestamp % self.resolution
+        current = self.buffer.latest()
+        if current is not None and current['timestamp'] == bucket:
+            count = current['count'] + 1
+            self.buffer.update_last(
+                min(current['min'], value),
+                max(current['max'], value),
+                current['avg'] + (value - current['avg']) / count,
+                value,
+                count
+            )
+        elif current is None or bucket > current['timestamp']:
+            self.buffer.append(bucket, value, value, value, value, 1)
+        # Samples older than the newest bucket only land in the raw tier
+
+
+class Series:
+    """Raw samples of one metric plus its downsampled rollup tiers."""
+
+    def __init__(self, capacity, tiers):
+        self.raw = RingBuffer(capacity)
+        self.rollups = [Rollup(resolution, buckets) for resolution, buckets in tiers]
+
+    def append(self, timestamp, value):
+        self.raw.append(timestamp, value)
+        for rollup in self.rollups:
+            rollup.add(timestamp, value)
+
+    def oldest(self):
+        """Timestamp of the oldest sample held in any in-memory tier."""
+        buffers = [self.raw] + [rollup.buffer for rollup in self.rollups]
+        return min((buffer.timestamp_at(0) for buffer in buffers if len(buffer)), default=float('inf'))
+
+    def pick_for_step(self, start, step):
+        """
+        Choose the coarsest tier whose buckets are no wider than step and that
+        covers start; otherwise raw samples, or the finest covering tier.
+        Returns (resolution, buffer) like pick().
+        """
+        for rollup in reversed(self.rollups):
+            if rollup.resolution <= step and self.covers(rollup.buffer, start):
+                return rollup.resolution, rollup.buffer
+        if self.covers(self.raw, start):
+            return None, self.raw
+        for rollup in self.rollups:
+            if self.covers(rollup.buffer, start):
+                return rollup.resolution, rollup.buffer
+        return None, self.raw
+
+    def covers(self, buffer, start):
+        """True if buffer holds samples going back to start."""
+        return len(buffer) > 0 and (buffer.timestamp_at(0) <= start or len(buffer) < buffer.capacity)
+
+    def pick(self, start, end, max_points):
+        """
+        Choose the finest tier that covers [start, end) with at most
+        max_points points. Returns (resolution, buffer); resolution is None
+        for raw samples. Falls back to the coarsest tier.
+        """
+        raw_points = self.raw.bisect(end) - self.raw.bisect(start)
+        if raw_points <= max_points and self.covers(self.raw, start):
+            return None, self.raw
+        for rollup in self.rollups:
+            if (end - start) / rollup.resolution <= max_points and self.covers(rollup.buffer, start):
+                return rollup.resolution, rollup.buffer
+        if self.rollups:
+            coarsest = self.rollups[-1]
+            return coarsest.resolution, coarsest.buffer
+        return None, self.raw
+
+
+class SegmentStore:
+    """
+    Append-only on-disk history with one segment file per series per day.
+    Segments are arrays of fixed-width (timestamp, value) records named
+    <series>/<YYYYMMDD>.seg (UTC days). Nothing is loaded at startup:
+    a read memory-maps only the segments overlapping its range, bisects the
+    mapped records and copies out just the requested slice; each map is
+    closed before the read returns. An hourly sweep closes the writers of series
+    that stopped reporting and applies retention to every series.
+    """
+
+    def __init__(self, directory, retention_days=DEFAULT_RETENTION_DAYS):
+        self.directory = directory
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._writers = {}     # series -> (day, file)
+        self._last_write = {}  # series -> monotonic time of its latest append
+        self._last_maintenance = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+    def _series_dir(self, name):
+        return os.path.join(self.directory, quote(name, safe=''))
+
+    @staticmethod
+    def _day(timestamp):
+        return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y%m%d')
+
+    def names(self):
+        """Names of every series with segments on disk."""
+        try:
+            return sorted(unquote(entry.name) for entry in os.scandir(self.directory) if entry.is_dir())
+        except OSError:
+            return []
+
+    def append(self, name, timestamp, value):
+        """Append one sample; rotates to a new segment when the day changes."""
+        day = self._day(timestamp)
+        with self._lock:
+            writer = self._writers.get(name)
+            if writer is None or writer[0] != day:
+                if writer is not None:
+                    writer[1].close()
+                series_dir = self._series_dir(name)
+                os.makedirs(series_dir, exist_ok=True)
+                writer = self._writers[name] = (day, open(os.path.join(series_dir, day + SEGMENT_SUFFIX), 'ab'))
+                self._expire(series_dir, timestamp)
+            writer[1].write(SEGMENT_RECORD.pack(timestamp, value))
+            self._last_write[name] = time.monotonic()
+
+    def flush(self):
+        """Flush buffered records of every open segment to disk."""
+        with self._lock:
+            for _, segment in self._writers.values():
+                segment.flush()
+            if time.monotonic() - self._last_maintenance >= MAINTENANCE_INTERVAL:
+                self._maintain()
+
+    def close(self):
+        with self._lock:
+            for _, segment in self._writers.values():
+                segment.close()
+            self._writers.clear()
+            self._last_write.clear()
+
+    def _maintain(self):
+        """Close idle writers and expire old segments of every series, live or not."""
+        now = time.monotonic()
+        self._last_maintenance = now
+        for name in [name for name, written in self._last_write.items() if now - written >= WRITER_IDLE_SECONDS]:
+            self._writers.pop(name)[1].close()
+            del self._last_write[name]
+
+        try:
+            series_dirs = [entry.path for entry in os.scandir(self.directory) if entry.is_dir()]
+        except OSError:
+            return
+        for series_dir in series_dirs:
+            self._expire(series_dir, time.time())
+            # Forget series whose every segment has expired
+            if unquote(os.path.basename(series_dir)) not in self._writers:
+                try:
+                    os.rmdir(series_dir)
+                except OSError:
+                    pass
+
+    def _expire(self, series_dir, now):
+        """Delete segments of one series older than the retention period."""
+        oldest = self._day(now - timedelta(days=self.retention_days).total_seconds())
+        try:
+            entries = list(os.scandir(series_dir))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.name.endswith(SEGMENT_SUFFIX) and entry.name[:-len(SEGMENT_SUFFIX)] < oldest:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    logger.warning(f"Could not remove expired history segment {entry.path}")
+
+    def _segments(self, name, start, end):
+        """Paths of the segments of a series overlapping [start, end), oldest first."""
+        try:
+            files = sorted(entry.name for entry in os.scandir(self._series_dir(name)) if entry.name.endswith(SEGMENT_SUFFIX))
+        except OSError:
+            return []
+        first_day = self._day(max(start, 0))
+        last_day = self._day(min(end, time.time() + 86400))
+        return [
+            os.path.join(self._series_dir(name), file)
+            for file in files
+            if first_day <= file[:-len(SEGMENT_SUFFIX)] <= last_day
+        ]
+
+    def _slice(self, path, start, end):
+        """
+        Map a segment and copy out (timestamps, values) with start <= timestamp < end,
+        or None if it has no such records. The map is closed before returning.
+        """
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                # Ignore a partially written trailing record
+                size -= size % SEGMENT_RECORD.size
+                if size == 0:
+                    return None
+                mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        # Every view has to be released before the map can be closed
+        with mapped, memoryview(mapped) as raw, raw.cast('d') as records, \
+                records[0::2] as timestamps, records[1::2] as values:
+            first = bisect.bisect_left(timestamps, start)
+            last = bisect.bisect_left(timestamps, end)
+            if first >= last:
+                return None
+            with timestamps[first:last] as part_timestamps, values[first:last] as part_values:
+                return array('d', part_timestamps.tobytes()), array('d', part_values.tobytes())
+
+    def read(self, name, start, end):
+        """
+        Return (timestamps, values) with start <= timestamp < end, copied out
+        of the mapped segments overlapping the range.
+        """
+        with self._lock:
+            writer = self._writers.get(name)
+            if writer is not None:
+                writer[1].flush()
+            parts = [part for part in (self._slice(path, start, end) for path in self._segments(name, start, end))
+                     if part is not None]
+
+        if not parts:
+            return _empty_window()
+        timestamps, values = parts[0]
+        for part_timestamps, part_values in parts[1:]:
+            timestamps.extend(part_timestamps)
+            values.extend(part_values)
+        return memoryview(timestamps), memoryview(values)
+
+
+class HistoryStore:
+    """
+    In-memory time-series store with one ring buffer per named series.
+    The scheduler writes samples and the API reads windows; series are
+    created on first write, so any number of per-core, per-disk or per-NIC
+    series can be recorded. Every series also keeps downsampled rollup
+    tiers that are updated on each write, so long ranges are served from a
+    few hundred precomputed buckets while memory stays bounded.
+    Reads return copies taken under the lock, so later appends never change
+    a window that is still being used.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, tiers=DEFAULT_TIERS, persist_dir=None,
+                 retention_days=DEFAULT_RETENTION_DAYS):
+        self.capacity = capacity
+        self.tiers = tuple(tiers)
+        self._series = {}
+        self._lock = threading.Lock()
+        # Optional on-disk copy of every raw sample
+        self.segments = SegmentStore(persist_dir, retention_days) if persist_dir else None
+
+    def __contains__(self, name):
+        return name in self._series
+
+    def names(self):
+        """Names of every recorded series, in memory or on disk."""
+        names = set(self._series)
+        if self.segments is not None:
+            names.update(self.segments.names())
+        return sorted(names)
+
+    def _on_disk(self, series, start):
+        """True if [start, ...) reaches further back than memory and disk can serve it."""
+        return self.segments is not None and (series is None or start < series.oldest())
+
+    def count(self, name):
+        """Number of samples currently held for a series."""
+        series = self._series.get(name)
+        return len(series.raw) if series is not None else 0
+
+    def append(self, name, value, timestamp=None):
+        """Record one sample for a series."""
+        self.record({name: value}, timestamp)
+
+    def record(self, values, timestamp=None):
+        """Record one sample for every series in `values` at the same timestamp."""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            for name, value in values.items():
+                series = self._series.get(name)
+                if series is None:
+                    series = self._series[name] = Series(self.capacity, self.tiers)
+                series.append(timestamp, float(value))
+                if self.segments is not None:
+                    self.segments.append(name, timestamp, float(value))
+        if self.segments is not None:
+            self.segments.flush()
+
+    def window(self, name, count=None):
+        """Return (timestamps, values) for the newest `count` samples of a series."""
+        series = self._series.get(name)
+        if series is None:
+            return _empty_window()
+        with self._lock:
+            data = series.raw.last(count)
+        return data['timestamp'], data['value']
+
+    def range(self, name, start, end=None):
+        """
+        Return (timestamps, values) with start <= timestamp < end.
+        Ranges older than the in-memory buffer are read from disk segments.
+        """
+        series = self._series.get(name)
+        if end is None:
+            end = float('inf')
+        if self.segments is not None and (series is None or start < series.raw.timestamp_at(0)):
+            return self.segments.read(name, start, end)
+        if series is None:
+            return _empty_window()
+        with self._lock:
+            data = series.raw.between(start, end)
+        return data['timestamp'], data['value']
+
+    def rollup(self, name, resolution, start, end=None):
+        """Return {column: values} of the rollup buckets overlapping [start, end)."""
+        series = self._series.get(name)
+        if series is None:
+            return None
+        if end is None:
+            end = float('inf')
+        start -= start % resolution
+        for rollup in series.rollups:
+            if rollup.resolution == resolution:
+                with self._lock:
+                    return rollup.buffer.between(start, end)
+        raise ValueError(f"No {resolution}s rollup tier")
+
+    def read(self, name, start, end=None, max_points=DEFAULT_MAX_POINTS, step=None):
+        """
+        Read [start, end) from the cheapest tier that still has at most
+        max_points points, or, if step is given, the coarsest tier with
+        buckets no wider than step. Returns (resolution, {column: values}) where
+        resolution is None for raw samples, or None if the series is unknown.
+        Ranges reaching back past every in-memory tier (e.g. after a restart)
+        are served as raw samples from disk segments.
+        """
+        series = self._series.get(name)
+        if end is None:
+            end = time.time()
+        if self._on_disk(series, start):
+            timestamps, values = self.segments.read(name, start, end)
+            if len(timestamps) or series is None:
+                return None, {'timestamp': timestamps, 'value': values}
+        if series is None:
+            return None
+        with self._lock:
+            if step is not None:
+                resolution, buffer = series.pick_for_step(start, step)
+            else:
+                resolution, buffer = series.pick(start, end, max_points)
+            if resolution:
+                # Include the bucket that contains start
+                start -= start % resolution
+            return resolution, buffer.between(start, end)
+
+    def query(self, names, start, end=None, step=None, agg='avg'):
+        """
+        Aggregate one or more series onto a shared grid of `step`-second buckets.
+        Returns (timestamps, {name: values}, {name: resolution}). Each series is
+        read from the cheapest tier with about one point per step; percentile
+        aggregations ('p95', 'p99', ...) use raw samples when they are still
+        available and fall back to bucket maxima otherwise.
+        """
+        if end is None:
+            end = time.time()
+        if not (math.isfinite(start) and math.isfinite(end)):
+            raise ValueError("start and end must be finite")
+        if end <= start:
+            raise ValueError("end must be after start")
+        if step is None:
+            step = (end - start) / DEFAULT_MAX_POINTS
+        if not math.isfinite(step) or step <= 0:
+            raise ValueError("step must be a positive number")
+        if agg not in QUERY_AGGREGATIONS and not (agg[:1] == 'p' and agg[1:].replace('.', '', 1).isdigit()
+                                                  and 0 < float(agg[1:]) <= 100):
+            raise ValueError(f"Unknown aggregation: {agg}")
+
+        origin = start - start % step
+        points = int(-(-(end - origin) // step))
+        if points > MAX_QUERY_POINTS:
+            raise ValueError(f"Query would return {points} points (max {MAX_QUERY_POINTS}); use a larger step")
+
+        series_values = {}
+        resolutions = {}
+        for name in names:
+            result = self.read(name, origin, end, step=step)
+            if result is None:
+                series_values[name] = [None] * points
+                resolutions[name] = None
+                continue
+            resolution, columns = result
+            values = _aggregate(columns, resolution, origin, step, points, agg)
+            if agg not in QUERY_AGGREGATIONS and resolution is not None:
+                # Percentiles need raw samples; keep bucket maxima where they are gone
+                timestamps, raw_values = self.range(name, origin, end)
+                raw = _aggregate({'timestamp': timestamps, 'value': raw_values}, None, origin, step, points, agg)
+                values = [raw_value if raw_value is not None else value for raw_value, value in zip(raw, values)]
+            series_values[name] = values
+            resolutions[name] = resolution
+
+        timestamps = [origin + index * step for index in range(points)]
+        return timestamps, series_values, resolutions
+
+    def latest(self, name, default=None):
+        """Return the newest value of a series."""
+        series = self._series.get(name)
+        if series is None:
+            return default
+        with self._lock:
+            sample = series.raw.latest()
+        return sample['value'] if sample else default
+
+
+def _empty_window():
+    empty = memoryview(array('d'))
+    return empty, empty
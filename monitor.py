@@ -1,10 +1,16 @@
 import psutil
 import platform
 import datetime
+import heapq
 import logging
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from cache_index import CacheIndex
+import perf
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -13,10 +19,211 @@ logger = logging.getLogger(__name__)
 BYTES_TO_GB = 1024 * 1024 * 1024
 BYTES_TO_MB = 1024 * 1024
 
+# Minimum time between two CPU samples; calls inside this window reuse the
+# previous result instead of measuring over a few microseconds.
+CPU_SAMPLE_MIN_INTERVAL = 0.5
+
+def _cpu_total_time(times):
+    """Total CPU time of a cpu_times() tuple, including idle time."""
+    total = sum(times)
+    # On Linux guest times are already accounted in user/nice
+    total -= getattr(times, 'guest', 0)
+    total -= getattr(times, 'guest_nice', 0)
+    return total
+
+def _cpu_busy_percent(previous, current):
+    """Busy percentage between two cpu_times() tuples."""
+    total_delta = _cpu_total_time(current) - _cpu_total_time(previous)
+    if total_delta <= 0:
+        return 0.0
+    idle_delta = (current.idle - previous.idle) + (getattr(current, 'iowait', 0) - getattr(previous, 'iowait', 0))
+    busy_percent = (total_delta - idle_delta) / total_delta * 100
+    return round(min(max(busy_percent, 0.0), 100.0), 1)
+
+class CpuSampler:
+    """
+    Non-blocking CPU utilisation sampler.
+    Keeps the previous cpu_times() snapshots and reports total and per-core
+    usage as deltas since the last sample, so no call ever sleeps.
+    """
+
+    def __init__(self, min_interval=CPU_SAMPLE_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_time = time.monotonic()
+        self._last_total = psutil.cpu_times()
+        self._last_per_core = psutil.cpu_times(percpu=True)
+        self._total_percent = 0.0
+        self._per_core_percent = [0.0] * len(self._last_per_core)
+
+    def sample(self):
+        """Return (total_percent, per_core_percents) since the previous sample."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_time >= self.min_interval:
+                total = psutil.cpu_times()
+                per_core = psutil.cpu_times(percpu=True)
+                self._total_percent = _cpu_busy_percent(self._last_total, total)
+                if len(per_core) == len(self._last_per_core):
+                    self._per_core_percent = [
+                        _cpu_busy_percent(previous, current)
+                        for previous, current in zip(self._last_per_core, per_core)
+                    ]
+                else:
+                    # CPUs were hot-plugged; start a new baseline for the cores
+                    self._per_core_percent = [0.0] * len(per_core)
+                self._last_time = now
+                self._last_total = total
+                self._last_per_core = per_core
+            return self._total_percent, list(self._per_core_percent)
+
+cpu_sampler = CpuSampler()
+
+# Cumulative network counters reported as per-second rates
+NET_COUNTERS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+                'errin', 'errout', 'dropin', 'dropout')
+
+# net.<counter> history series hold per-second rates; the cumulative counter
+# is also recorded as net.<counter> plus this suffix, for rate() in rules
+COUNTER_SERIES_SUFFIX = '.total'
+
+# A counter that goes backwards within this margin of 2**32 is assumed to be a
+# wrapped 32-bit counter; anything else going backwards has been reset.
+COUNTER_WRAP = 2 ** 32
+COUNTER_WRAP_MARGIN = 2 ** 30
+
+def _counter_delta(previous, current):
+    """Increase of a cumulative counter, allowing for wraparound and resets."""
+    if current >= previous:
+        return current - previous
+    if COUNTER_WRAP - COUNTER_WRAP_MARGIN <= previous < COUNTER_WRAP:
+        return current + COUNTER_WRAP - previous
+    # Reset (e.g. the interface was re-created); count from zero
+    return current
+
+class CounterRates:
+    """
+    Per-second rates of cumulative counters for a set of devices.
+    Keeps the previous counters and timestamp of every device; a device
+    reports zero rates on its first sample and is forgotten once it
+    disappears.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._previous = {}  # device -> (timestamp, counters)
+
+    def update(self, counters, now):
+        """Take {device: counters namedtuple}; return {device: {field: rate per second}}."""
+        rates = {}
+        for device, current in counters.items():
+            last = self._previous.get(device)
+            if last is None or now <= last[0]:
+                rates[device] = dict.fromkeys(self.fields, 0.0)
+                continue
+            elapsed = now - last[0]
+            rates[device] = {
+                field: _counter_delta(getattr(last[1], field, 0), getattr(current, field, 0)) / elapsed
+                for field in self.fields
+            }
+        self._previous = {device: (now, current) for device, current in counters.items()}
+        return rates
+
+class NetworkSampler:
+    """
+    Network counters with throughput rates, in aggregate and per NIC.
+    Like CpuSampler, calls within min_interval reuse the previous sample.
+    """
+
+    def __init__(self, min_interval=CPU_SAMPLE_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._total_rates = CounterRates(NET_COUNTERS)
+        self._nic_rates = CounterRates(NET_COUNTERS)
+        self._last_time = None
+        self._result = None
+
+    def sample(self):
+        """Return (total counters, total rates, {nic: counters}, {nic: rates})."""
+        with self._lock:
+            now = time.monotonic()
+            if self._result is None or now - self._last_time >= self.min_interval:
+                # psutil already compensates for wraps it sees between its own
+                # calls (nowrap=True); CounterRates covers resets and anything missed
+                total = psutil.net_io_counters()
+                pernic = psutil.net_io_counters(pernic=True)
+                total_rates = self._total_rates.update({'total': total}, now)['total']
+                nic_rates = self._nic_rates.update(pernic, now)
+                self._result = (total, total_rates, pernic, nic_rates)
+                self._last_time = now
+            return self._result
+
+network_sampler = NetworkSampler()
+
+# Cumulative disk I/O counters turned into rates; busy_time is Linux-only
+DISK_IO_COUNTERS = ('read_bytes', 'write_bytes', 'read_count', 'write_count',
+                    'read_time', 'write_time', 'busy_time')
+
+# Virtual block devices left out of the per-disk I/O statistics
+DISK_IO_EXCLUDE = re.compile(r'^(loop|ram)\d+$')
+
+class DiskIOSampler:
+    """
+    Per-disk I/O throughput, IOPS, latency and busy percentage derived from
+    disk_io_counters(perdisk=True) deltas. Calls within min_interval reuse
+    the previous sample.
+    """
+
+    def __init__(self, min_interval=CPU_SAMPLE_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._rates = CounterRates(DISK_IO_COUNTERS)
+        self._last_time = None
+        self._result = None
+
+    def sample(self):
+        """Return {disk: {read_bytes, write_bytes, read_iops, write_iops, read_latency, write_latency, busy}}."""
+        with self._lock:
+            now = time.monotonic()
+            if self._result is None or now - self._last_time >= self.min_interval:
+                counters = psutil.disk_io_counters(perdisk=True) or {}
+                counters = {disk: io for disk, io in counters.items() if not DISK_IO_EXCLUDE.match(disk)}
+                self._result = {
+                    disk: _disk_io_stats(rates, hasattr(counters[disk], 'busy_time'))
+                    for disk, rates in self._rates.update(counters, now).items()
+                }
+                self._last_time = now
+            return self._result
+
+def _disk_io_stats(rates, has_busy_time):
+    """Derive per-disk statistics from counter rates (times are in ms)."""
+    read_iops = rates['read_count']
+    write_iops = rates['write_count']
+    return {
+        'read_bytes': round(rates['read_bytes'], 2),    # bytes/s
+        'write_bytes': round(rates['write_bytes'], 2),  # bytes/s
+        'read_iops': round(read_iops, 2),
+        'write_iops': round(write_iops, 2),
+        # Average ms per request completed during the interval
+        'read_latency': round(rates['read_time'] / read_iops, 2) if read_iops else 0.0,
+        'write_latency': round(rates['write_time'] / write_iops, 2) if write_iops else 0.0,
+        # ms busy per second -> percent of the interval
+        'busy': round(min(rates['busy_time'] / 10, 100.0), 1) if has_busy_time else None
+    }
+
+disk_io_sampler = DiskIOSampler()
+
+@perf.timed_function()
 def get_cpu_usage():
-    """Get current CPU usage percentage."""
-    return psutil.cpu_percent(interval=1)
+    """Get current CPU usage percentage (since the previous sample)."""
+    try:
+        total_percent, _ = cpu_sampler.sample()
+        return total_percent
+    except Exception as e:
+        logger.exception("Error getting CPU usage")
+        return 0.0
 
+@perf.timed_function()
 def get_cpu_info():
     """Get detailed CPU information."""
     try:
@@ -28,7 +235,7 @@ def get_cpu_info():
             current_freq = 0
             
         # Get per-core usage
-        per_core = psutil.cpu_percent(interval=0.1, percpu=True)
+        _, per_core = cpu_sampler.sample()
         
         return {
             'count': cpu_count,
@@ -39,6 +246,7 @@ def get_cpu_info():
         logger.exception("Error getting CPU info")
         return {'count': 0, 'frequency': 0, 'per_core': []}
 
+@perf.timed_function()
 def get_memory_usage():
     """Get current memory usage information."""
     try:
@@ -47,12 +255,18 @@ def get_memory_usage():
             'total': round(memory.total / BYTES_TO_GB, 2),  # GB
             'used': round(memory.used / BYTES_TO_GB, 2),    # GB
             'free': round(memory.available / BYTES_TO_GB, 2),  # GB
-            'percent': memory.percent
+            'percent': memory.percent,
+            # Exact values for the metrics exposition
+            'total_bytes': memory.total,
+            'used_bytes': memory.used,
+            'available_bytes': memory.available
         }
     except Exception as e:
         logger.exception("Error getting memory usage")
-        return {'total': 0, 'used': 0, 'free': 0, 'percent': 0}
+        return {'total': 0, 'used': 0, 'free': 0, 'percent': 0,
+                'total_bytes': 0, 'used_bytes': 0, 'available_bytes': 0}
 
+@perf.timed_function()
 def get_disk_usage(path="/"):
     """Get disk usage for the main drive."""
     try:
@@ -71,6 +285,7 @@ def get_disk_usage(path="/"):
         logger.exception(f"Error getting disk usage for {path}")
         return {'total': 0, 'used': 0, 'free': 0, 'percent': 0}
 
+@perf.timed_function()
 def get_disk_info():
     """Get information about all disk partitions."""
     try:
@@ -87,7 +302,11 @@ def get_disk_info():
                     'total': round(usage.total / BYTES_TO_GB, 2),
                     'used': round(usage.used / BYTES_TO_GB, 2),
                     'free': round(usage.free / BYTES_TO_GB, 2),
-                    'percent': usage.percent
+                    'percent': usage.percent,
+                    # Exact values for the metrics exposition
+                    'total_bytes': usage.total,
+                    'used_bytes': usage.used,
+                    'free_bytes': usage.free
                 })
             except Exception:
                 # Some partitions might not be accessible
@@ -98,146 +317,371 @@ def get_disk_info():
         logger.exception("Error getting disk information")
         return []
 
+@perf.timed_function()
+def get_disk_io_info():
+    """Get per-disk I/O rates, IOPS, latency (ms) and busy percentage."""
+    try:
+        return disk_io_sampler.sample()
+    except Exception as e:
+        logger.exception("Error getting disk I/O information")
+        return {}
+
+@perf.timed_function()
 def get_network_info():
-    """Get network usage information."""
+    """
+    Get network usage information: cumulative counters since boot, plus
+    per-second 'rates', per-interface rates under 'interfaces' and
+    per-interface cumulative counters under 'interface_counters'.
+    """
     try:
-        net_counters = psutil.net_io_counters()
-        return {
-            'bytes_sent': net_counters.bytes_sent,
-            'bytes_recv': net_counters.bytes_recv,
-            'packets_sent': net_counters.packets_sent,
-            'packets_recv': net_counters.packets_recv,
-            'errin': net_counters.errin,
-            'errout': net_counters.errout,
-            'dropin': net_counters.dropin,
-            'dropout': net_counters.dropout
+        net_counters, rates, nic_counters, nic_rates = network_sampler.sample()
+        info = {field: getattr(net_counters, field) for field in NET_COUNTERS}
+        info['rates'] = {field: round(rate, 2) for field, rate in rates.items()}
+        info['interfaces'] = {
+            nic: {field: round(rate, 2) for field, rate in values.items()}
+            for nic, values in nic_rates.items()
+        }
+        info['interface_counters'] = {
+            nic: {field: getattr(counters, field) for field in NET_COUNTERS}
+            for nic, counters in nic_counters.items()
         }
+        return info
     except Exception as e:
         logger.exception("Error getting network information")
-        return {
-            'bytes_sent': 0, 'bytes_recv': 0, 
-            'packets_sent': 0, 'packets_recv': 0,
-            'errin': 0, 'errout': 0, 'dropin': 0, 'dropout': 0
-        }
+        info = dict.fromkeys(NET_COUNTERS, 0)
+        info['rates'] = dict.fromkeys(NET_COUNTERS, 0.0)
+        info['interfaces'] = {}
+        info['interface_counters'] = {}
+        return info
 
-def get_system_logs(count=10):
+class Snapshot:
     """
-    Get recent system logs.
-    Creates system event logs based on system metrics since actual log access may be restricted.
+    Every metric for one collection pass, gathered exactly once.
+    Logs, alerts, history and the dashboard payload are all derived from the
+    same snapshot so consumers see consistent numbers.
     """
-    logs = []
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    try:
-        # Always generate useful system information logs regardless of platform
-        # System info logs
-        system_info = get_system_info()
-        logs.append({
-            'timestamp': current_time,
-            'source': 'System',
-            'level': 'Information',
-            'message': f'OS: {system_info["system"]} {system_info["release"]}, Machine: {system_info["machine"]}'
-        })
-        
-        # Boot time
-        boot_time = datetime.fromtimestamp(psutil.boot_time()).strftime("%Y-%m-%d %H:%M:%S")
-        logs.append({
-            'timestamp': current_time,
-            'source': 'Boot',
-            'level': 'Information',
-            'message': f'System boot time: {boot_time}'
-        })
-        
-        # CPU information
-        cpu_info = get_cpu_info()
-        cpu_percent = get_cpu_usage()
-        logs.append({
-            'timestamp': current_time,
-            'source': 'CPU',
-            'level': 'Information' if cpu_percent < 80 else 'Warning',
-            'message': f'CPU usage: {cpu_percent}%, Cores: {cpu_info["count"]}, Frequency: {cpu_info["frequency"]} MHz'
-        })
-        
-        # Memory information
-        memory_info = get_memory_usage()
-        logs.append({
-            'timestamp': current_time,
-            'source': 'Memory',
-            'level': 'Information' if memory_info['percent'] < 80 else 'Warning',
-            'message': f'Memory: {memory_info["used"]} GB used out of {memory_info["total"]} GB ({memory_info["percent"]}%)'
-        })
-        
-        # Disk information
-        disk_usage = get_disk_usage()
-        logs.append({
-            'timestamp': current_time,
-            'source': 'Disk',
-            'level': 'Information' if disk_usage['percent'] < 80 else 'Warning',
-            'message': f'Disk: {disk_usage["used"]} GB used out of {disk_usage["total"]} GB ({disk_usage["percent"]}%)'
-        })
-        
-        # Network information
-        network_info = get_network_info()
-        logs.append({
-            'timestamp': current_time,
-            'source': 'Network',
-            'level': 'Information',
-            'message': f'Network: {network_info["bytes_sent"]/BYTES_TO_MB:.2f} MB sent, {network_info["bytes_recv"]/BYTES_TO_MB:.2f} MB received'
-        })
-        
-        # Add top processes information
-        processes = get_processes(1)  # Get top process
-        if processes:
-            top_process = processes[0]
+
+    def __init__(self, timestamp, system_info, cpu_percent, cpu_info, memory, disk, network, processes,
+                 disk_io=None):
+        self.timestamp = timestamp
+        self.system_info = system_info
+        self.cpu_percent = cpu_percent
+        self.cpu_info = cpu_info
+        self.memory = memory
+        self.disk = disk
+        self.network = network
+        self.processes = processes
+        self.disk_io = disk_io if disk_io is not None else {}
+
+    @classmethod
+    def collect(cls, process_count=15):
+        """Collect a new snapshot of the system."""
+        return cls(
+            timestamp=datetime.now(),
+            system_info=get_system_info(),
+            cpu_percent=get_cpu_usage(),
+            cpu_info=get_cpu_info(),
+            memory=get_memory_usage(),
+            disk=get_disk_usage(),
+            network=get_network_info(),
+            processes=get_processes(process_count) if process_count else [],
+            disk_io=get_disk_io_info()
+        )
+
+    def samples(self, disk_info=None):
+        """
+        Flatten this snapshot into history series: {name: value}.
+        disk_info (from get_disk_info()) adds per-partition usage.
+        """
+        samples = {
+            'cpu': self.cpu_percent,
+            'memory': self.memory['percent'],
+            'disk': self.disk['percent']
+        }
+        for core, core_percent in enumerate(self.cpu_info['per_core']):
+            samples[f'cpu.core[{core}]'] = core_percent
+        # Network rates per second, in aggregate and per interface
+        for field, rate in self.network['rates'].items():
+            samples[f'net.{field}'] = rate
+        for field in NET_COUNTERS:
+            samples[f'net.{field}{COUNTER_SERIES_SUFFIX}'] = self.network[field]
+        for nic, rates in self.network['interfaces'].items():
+            for field, rate in rates.items():
+                samples[f'net[{nic}].{field}'] = rate
+        # Disk I/O per device; busy is None where the platform lacks busy_time
+        for disk, stats in self.disk_io.items():
+            for field, value in stats.items():
+                if value is not None:
+                    samples[f'diskio[{disk}].{field}'] = value
+        for partition in disk_info or []:
+            samples[f"disk[{partition['mountpoint']}].percent"] = partition['percent']
+        return samples
+
+    def logs(self, count=10):
+        """
+        Build system event logs from this snapshot.
+        Actual log access may be restricted, so the logs describe the collected metrics.
+        """
+        logs = []
+        current_time = self.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+
+        try:
+            # System info logs
+            system_info = self.system_info
             logs.append({
                 'timestamp': current_time,
-                'source': 'Process',
+                'source': 'System',
                 'level': 'Information',
-                'message': f'Top process: {top_process["name"]} (PID: {top_process["pid"]}) - CPU: {top_process["cpu_percent"]}%, Memory: {top_process["memory_percent"]}%'
+                'message': f'OS: {system_info["system"]} {system_info["release"]}, Machine: {system_info["machine"]}'
             })
-        
-    except Exception as e:
-        logger.exception("Error generating system logs")
-        logs.append({
-            'timestamp': current_time,
-            'source': 'Error',
-            'level': 'Error',
-            'message': f'Failed to generate system logs: {str(e)}'
-        })
-    
-    # Return at most 'count' logs, newest first
-    return logs[-count:]
 
-def get_processes(count=10):
-    """Get top processes by memory usage."""
-    try:
-        processes = []
-        for proc in sorted(psutil.process_iter(['pid', 'name', 'username', 'memory_percent', 'cpu_percent']), 
-                           key=lambda p: p.info['memory_percent'] or 0, 
-                           reverse=True)[:count]:
-            try:
-                # Get process creation time
-                create_time = datetime.fromtimestamp(proc.create_time()).strftime("%Y-%m-%d %H:%M:%S")
-                processes.append({
-                    'pid': proc.info['pid'],
-                    'name': proc.info['name'],
-                    'username': proc.info['username'],
-                    'memory_percent': round(proc.info['memory_percent'], 2) if proc.info['memory_percent'] else 0,
-                    'cpu_percent': round(proc.info['cpu_percent'], 2) if proc.info['cpu_percent'] else 0,
-                    'create_time': create_time
+            # Boot time
+            logs.append({
+                'timestamp': current_time,
+                'source': 'Boot',
+                'level': 'Information',
+                'message': f'System boot time: {system_info["boot_time"]}'
+            })
+
+            # CPU information
+            cpu_info = self.cpu_info
+            cpu_percent = self.cpu_percent
+            logs.append({
+                'timestamp': current_time,
+                'source': 'CPU',
+                'level': 'Information' if cpu_percent < 80 else 'Warning',
+                'message': f'CPU usage: {cpu_percent}%, Cores: {cpu_info["count"]}, Frequency: {cpu_info["frequency"]} MHz'
+            })
+
+            # Memory information
+            memory_info = self.memory
+            logs.append({
+                'timestamp': current_time,
+                'source': 'Memory',
+                'level': 'Information' if memory_info['percent'] < 80 else 'Warning',
+                'message': f'Memory: {memory_info["used"]} GB used out of {memory_info["total"]} GB ({memory_info["percent"]}%)'
+            })
+
+            # Disk information
+            disk_usage = self.disk
+            logs.append({
+                'timestamp': current_time,
+                'source': 'Disk',
+                'level': 'Information' if disk_usage['percent'] < 80 else 'Warning',
+                'message': f'Disk: {disk_usage["used"]} GB used out of {disk_usage["total"]} GB ({disk_usage["percent"]}%)'
+            })
+
+            # Network information
+            network_info = self.network
+            logs.append({
+                'timestamp': current_time,
+                'source': 'Network',
+                'level': 'Information',
+                'message': f'Network: {network_info["bytes_sent"]/BYTES_TO_MB:.2f} MB sent, {network_info["bytes_recv"]/BYTES_TO_MB:.2f} MB received'
+            })
+
+            # Add top process information
+            if self.processes:
+                top_process = self.processes[0]
+                logs.append({
+                    'timestamp': current_time,
+                    'source': 'Process',
+                    'level': 'Information',
+                    'message': f'Top process: {top_process["name"]} (PID: {top_process["pid"]}) - CPU: {top_process["cpu_percent"]}%, Memory: {top_process["memory_percent"]}%'
                 })
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
+
+        except Exception as e:
+            logger.exception("Error generating system logs")
+            logs.append({
+                'timestamp': current_time,
+                'source': 'Error',
+                'level': 'Error',
+                'message': f'Failed to generate system logs: {str(e)}'
+            })
+
+        # Return at most 'count' logs, newest first
+        return logs[-count:]
+
+def get_system_logs(count=10):
+    """
+    Get recent system logs.
+    Creates system event logs based on system metrics since actual log access may be restricted.
+    """
+    return Snapshot.collect(process_count=1).logs(count)
+
+# Keys get_processes() can rank by
+PROCESS_SORT_KEYS = ('rss', 'cpu', 'io', 'fds')
+
+class ProcessTracker:
+    """
+    Long-lived process table keyed by (pid, create_time).
+    Process objects are reused between refreshes so cpu_percent() measures
+    the time since the previous refresh, and dead PIDs are evicted.
+    """
+
+    def __init__(self, min_interval=CPU_SAMPLE_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._table = {}     # (pid, create_time) -> entry
+        self._pid_keys = {}  # pid -> (pid, create_time)
+        self._rows = []
+        self._last_refresh = None
+        self._last_sort_by = None
+
+    def _track(self, proc):
+        """Start tracking a process; returns its table entry."""
+        pid = proc.pid
+        key = (pid, proc.create_time())
+        try:
+            username = proc.username()
+        except (psutil.AccessDenied, KeyError):
+            username = None
+        entry = {
+            'key': key,
+            'process': proc,
+            'name': proc.name(),
+            'username': username,
+            'io_bytes': None,
+            'io_time': None
+        }
+        self._table[key] = entry
+        self._pid_keys[pid] = key
+        return entry
+
+    def _evict(self, pid):
+        key = self._pid_keys.pop(pid, None)
+        if key is not None:
+            self._table.pop(key, None)
+
+    def _io_rate(self, entry, proc, now):
+        """Bytes per second read and written since the previous refresh."""
+        try:
+            io = proc.io_counters()
+        except (psutil.AccessDenied, AttributeError):
+            return 0.0
+        io_bytes = io.read_bytes + io.write_bytes
+        rate = 0.0
+        if entry['io_bytes'] is not None and now > entry['io_time']:
+            rate = max(io_bytes - entry['io_bytes'], 0) / (now - entry['io_time'])
+        entry['io_bytes'] = io_bytes
+        entry['io_time'] = now
+        return rate
+
+    def _num_fds(self, proc):
+        try:
+            if hasattr(proc, 'num_fds'):
+                return proc.num_fds()
+            return proc.num_handles()
+        except psutil.AccessDenied:
+            return 0
+
+    def refresh(self, sort_by='rss'):
+        """Sample every process once and return the unsorted rows."""
+        total_memory = psutil.virtual_memory().total
+        now = time.monotonic()
+        rows = []
+        pids = psutil.pids()
+
+        for pid in pids:
+            try:
+                # A PID only identifies the same process while its create
+                # time matches; otherwise the PID has been reused
+                current = psutil.Process(pid)
+                entry = self._table.get((pid, current.create_time()))
+                if entry is None:
+                    self._evict(pid)
+                    entry = self._track(current)
+                proc = entry['process']
+                with proc.oneshot():
+                    cpu_percent = proc.cpu_percent()
+                    rss = proc.memory_info().rss
+                    row = {
+                        'entry': entry,
+                        'cpu': cpu_percent,
+                        'rss': rss,
+                        'memory_percent': rss / total_memory * 100 if total_memory else 0
+                    }
+                    if sort_by == 'io':
+                        row['io'] = self._io_rate(entry, proc, now)
+                    elif sort_by == 'fds':
+                        row['fds'] = self._num_fds(proc)
+                rows.append(row)
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                self._evict(pid)
+            except psutil.AccessDenied:
+                continue
+
+        # Evict processes that have exited since the previous refresh
+        alive = set(pids)
+        for pid in [pid for pid in self._pid_keys if pid not in alive]:
+            self._evict(pid)
+
+        return rows
+
+    def top(self, count=10, sort_by='rss'):
+        """Return the top `count` processes ranked by `sort_by`."""
+        if sort_by not in PROCESS_SORT_KEYS:
+            raise ValueError(f"Unknown process sort key: {sort_by}")
+
+        with self._lock:
+            now = time.monotonic()
+            if (self._last_refresh is None or sort_by != self._last_sort_by
+                    or now - self._last_refresh >= self.min_interval):
+                self._rows = self.refresh(sort_by)
+                self._last_refresh = now
+                self._last_sort_by = sort_by
+            top_rows = heapq.nlargest(count, self._rows, key=lambda row: row[sort_by])
+
+        processes = []
+        for row in top_rows:
+            entry = row['entry']
+            pid, create_time = entry['key']
+            process = {
+                'pid': pid,
+                'name': entry['name'],
+                'username': entry['username'],
+                'memory_percent': round(row['memory_percent'], 2),
+                'cpu_percent': round(row['cpu'], 2),
+                'create_time': datetime.fromtimestamp(create_time).strftime("%Y-%m-%d %H:%M:%S")
+            }
+            if sort_by == 'io':
+                process['io_rate'] = round(row['io'], 2)
+            elif sort_by == 'fds':
+                process['num_fds'] = row['fds']
+            processes.append(process)
         return processes
+
+    def by_name(self):
+        """
+        Totals of the latest refresh grouped by process name:
+        {name: {'rss', 'cpu', 'memory_percent', 'count'}}.
+        """
+        with self._lock:
+            rows = self._rows
+        totals = {}
+        for row in rows:
+            total = totals.setdefault(row['entry']['name'], {'rss': 0, 'cpu': 0.0, 'memory_percent': 0.0, 'count': 0})
+            total['rss'] += row['rss']
+            total['cpu'] += row['cpu']
+            total['memory_percent'] += row['memory_percent']
+            total['count'] += 1
+        return totals
+
+process_tracker = ProcessTracker()
+
+@perf.timed_function()
+def get_processes(count=10, sort_by='rss'):
+    """Get top processes by memory (rss), cpu, io or fds usage."""
+    try:
+        return process_tracker.top(count, sort_by)
+    except ValueError:
+        raise
     except Exception as e:
         logger.exception("Error getting process information")
         return []
 
-def get_cache_info():
-    """
-    Get information about cache, temp files, and other unwanted files.
-    Returns the total size and file counts in various temp/cache locations.
-    """
+def get_cache_paths():
+    """Get the OS-specific cache and temp locations to scan."""
     cache_paths = []
     
     # Define OS-specific paths
@@ -261,30 +705,28 @@ def get_cache_info():
             os.path.join(home, '.config', 'google-chrome', 'Default', 'Cache')
         ]
     
+    return cache_paths
+
+cache_index = CacheIndex()
+
+@perf.timed_function()
+def get_cache_info():
+    """
+    Get information about cache, temp files, and other unwanted files.
+    Returns the total size and file counts in various temp/cache locations.
+    Sizes come from the incremental cache index, so only directories that
+    changed since the previous scan are re-listed.
+    """
     result = {
         'total_size': 0,  # in bytes
         'file_count': 0,
         'paths': {}
     }
     
-    for path in cache_paths:
+    for path in get_cache_paths():
         try:
-            path_size = 0
-            file_count = 0
-            
             if os.path.exists(path):
-                for root, dirs, files in os.walk(path, topdown=True, onerror=None, followlinks=False):
-                    try:
-                        for file in files:
-                            try:
-                                file_path = os.path.join(root, file)
-                                file_size = os.path.getsize(file_path)
-                                path_size += file_size
-                                file_count += 1
-                            except (OSError, PermissionError):
-                                continue
-                    except (OSError, PermissionError):
-                        continue
+                path_size, file_count = cache_index.scan(path)
                 
                 # Only add non-empty directories
                 if path_size > 0:
@@ -297,19 +739,101 @@ def get_cache_info():
         except Exception as e:
             logger.warning(f"Error scanning cache directory {path}: {str(e)}")
     
+    # Persist the index so a restart does not trigger a cold rescan
+    cache_index.save()
+    
     return result
 
-def clean_cache_files(paths=None):
+# Upper bound on concurrent top-level cleanups
+CLEAN_MAX_WORKERS = 4
+# Minimum time between two progress callbacks
+CLEAN_PROGRESS_INTERVAL = 0.5
+
+class _CleanupProgress:
+    """Thread-safe running totals for a cleanup, reported at most every CLEAN_PROGRESS_INTERVAL."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.bytes_freed = 0
+        self.files_removed = 0
+        self.current_path = None
+        self._lock = threading.Lock()
+        self._last_report = 0.0
+
+    def add(self, file_path, size):
+        with self._lock:
+            self.bytes_freed += size
+            self.files_removed += 1
+            self.current_path = file_path
+            now = time.monotonic()
+            if self.callback is None or now - self._last_report < CLEAN_PROGRESS_INTERVAL:
+                return
+            self._last_report = now
+            progress = self.as_dict()
+        self.callback(progress)
+
+    def as_dict(self):
+        return {
+            'bytes_freed': self.bytes_freed,
+            'files_removed': self.files_removed,
+            'current_path': self.current_path
+        }
+
+def _clean_tree(root, progress):
+    """
+    Delete everything below root in a single bottom-up pass.
+    Files are removed while listing, and each directory is removed once all
+    of its children have been processed (if it is empty by then).
+    The root directory itself is kept.
+    """
+    cleaned = 0
+    files_removed = 0
+    stack = [(root, False)]
+    
+    while stack:
+        path, listed = stack.pop()
+        if listed:
+            if path != root:
+                try:
+                    os.rmdir(path)
+                except (OSError, PermissionError):
+                    pass
+            continue
+        
+        # Revisit this directory after its children
+        stack.append((path, True))
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, False))
+                            continue
+                        file_size = entry.stat(follow_symlinks=False).st_size
+                        os.remove(entry.path)
+                        cleaned += file_size
+                        files_removed += 1
+                        progress.add(entry.path, file_size)
+                    except (OSError, PermissionError):
+                        continue
+        except (OSError, PermissionError):
+            continue
+    
+    return cleaned, files_removed
+
+@perf.timed_function()
+def clean_cache_files(paths=None, progress=None):
     """
     Clean cache and temporary files from the system.
     If paths is None, it will clean all known cache locations.
     Otherwise, it will only clean the specified paths.
+    Each top-level path is cleaned on its own worker thread. If given,
+    progress is called with bytes_freed, files_removed and current_path
+    while the cleanup runs.
     Returns a dictionary with the results of the cleaning operation.
     """
     if paths is None:
-        # Get all cache paths from get_cache_info
-        cache_info = get_cache_info()
-        paths = list(cache_info['paths'].keys())
+        paths = get_cache_paths()
     
     result = {
         'successful': [],
@@ -318,33 +842,16 @@ def clean_cache_files(paths=None):
         'files_removed': 0
     }
     
-    for path in paths:
-        try:
-            path_cleaned = 0
-            files_removed = 0
-            
-            if os.path.exists(path):
-                for root, dirs, files in os.walk(path, topdown=True, onerror=None, followlinks=False):
-                    for file in files:
-                        try:
-                            file_path = os.path.join(root, file)
-                            file_size = os.path.getsize(file_path)
-                            os.remove(file_path)
-                            path_cleaned += file_size
-                            files_removed += 1
-                        except (OSError, PermissionError):
-                            continue
-                
-                # Try to remove empty directories
-                for root, dirs, files in os.walk(path, topdown=False, onerror=None, followlinks=False):
-                    for dir_name in dirs:
-                        try:
-                            dir_path = os.path.join(root, dir_name)
-                            if not os.listdir(dir_path):  # if directory is empty
-                                os.rmdir(dir_path)
-                        except (OSError, PermissionError):
-                            continue
-                
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        return result
+    
+    tracker = _CleanupProgress(progress)
+    with ThreadPoolExecutor(max_workers=min(len(paths), CLEAN_MAX_WORKERS)) as executor:
+        futures = {executor.submit(_clean_tree, path, tracker): path for path in paths}
+        for future, path in futures.items():
+            try:
+                path_cleaned, files_removed = future.result()
                 result['successful'].append({
                     'path': path,
                     'cleaned': path_cleaned,
@@ -352,15 +859,18 @@ def clean_cache_files(paths=None):
                 })
                 result['total_cleaned'] += path_cleaned
                 result['files_removed'] += files_removed
-            
-        except Exception as e:
-            result['failed'].append({
-                'path': path,
-                'error': str(e)
-            })
+            except Exception as e:
+                result['failed'].append({
+                    'path': path,
+                    'error': str(e)
+                })
+    
+    if progress is not None:
+        progress(tracker.as_dict())
     
     return result
 
+@perf.timed_function()
 def get_system_info():
     """Get general system information."""
     try:
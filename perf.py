@@ -0,0 +1,188 @@
+import io
+import time
+import pstats
+import cProfile
+import logging
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Durations kept per timer for the rolling percentiles
+TIMER_WINDOW = 512
+
+# Percentiles reported for every timer
+PERCENTILES = (50, 95, 99)
+
+# Upper bound on ticks captured by one profile
+MAX_PROFILE_TICKS = 100
+
+
+class Timer:
+    """Rolling window of durations (seconds) for one code path."""
+
+    def __init__(self, name, window=TIMER_WINDOW):
+        self.name = name
+        self.durations = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.last = None
+        self.last_error = None
+        self.last_error_time = None
+
+    def record(self, duration, error=None):
+        # deque.append is atomic, so no lock is needed on the hot path
+        self.durations.append(duration)
+        self.count += 1
+        self.last = duration
+        if error is not None:
+            self.errors += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self.last_error_time = time.time()
+
+    def percentile(self, percent):
+        return _percentile(sorted(self.durations), percent)
+
+    def as_dict(self):
+        """Statistics in milliseconds."""
+        durations = sorted(self.durations)
+        stats = {
+            'count': self.count,
+            'errors': self.errors,
+            'last_ms': _ms(self.last),
+            'max_ms': _ms(durations[-1]) if durations else None,
+            'last_error': self.last_error,
+            'last_error_time': self.last_error_time
+        }
+        for percent in PERCENTILES:
+            stats[f'p{percent}_ms'] = _ms(_percentile(durations, percent))
+        return stats
+
+
+def _percentile(durations, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not durations:
+        return None
+    index = min(len(durations) - 1, max(0, int(round(percent / 100 * len(durations))) - 1))
+    return durations[index]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+class PerfRegistry:
+    """Named timers plus an optional cProfile capture of the next N ticks."""
+
+    def __init__(self):
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._profile = None  # {'profiler', 'remaining', 'ticks', 'started'}
+        self._profile_result = None
+
+    def timer(self, name):
+        timer = self._timers.get(name)
+        if timer is None:
+            with self._lock:
+                timer = self._timers.setdefault(name, Timer(name))
+        return timer
+
+    @contextmanager
+    def timed(self, name):
+        """Time a block; exceptions are recorded as the timer's last error and re-raised."""
+        timer = self.timer(name)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            timer.record(time.perf_counter() - start, e)
+            raise
+        timer.record(time.perf_counter() - start)
+
+    def timed_function(self, name=None):
+        """Decorator form of timed(); defaults to the function's qualified name."""
+        def decorator(func):
+            timer_name = name or f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timed(timer_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """{timer name: statistics} for every timer."""
+        with self._lock:
+            timers = list(self._timers.values())
+        return {timer.name: timer.as_dict() for timer in sorted(timers, key=lambda timer: timer.name)}
+
+    def samples(self, percent=95):
+        """Self-metrics for the history store: {'perf[<timer>].p95': ms}."""
+        with self._lock:
+            timers = list(self._timers.values())
+        samples = {}
+        for timer in timers:
+            value = timer.percentile(percent)
+            if value is not None:
+                samples[f'perf[{timer.name}].p{percent}'] = value * 1000
+        return samples
+
+    def start_profile(self, ticks):
+        """Profile the next `ticks` ticks; returns False if a capture is already running."""
+        ticks = max(1, min(int(ticks), MAX_PROFILE_TICKS))
+        with self._lock:
+            if self._profile is not None:
+                return False
+            self._profile = {'profiler': cProfile.Profile(), 'remaining': ticks, 'ticks': ticks,
+                             'started': time.time()}
+            self._profile_result = None
+            return True
+
+    @contextmanager
+    def profile_tick(self):
+        """Wrap one tick; profiles it while a capture is running."""
+        profile = self._profile
+        if profile is None:
+            yield
+            return
+        profile['profiler'].enable()
+        try:
+            yield
+        finally:
+            profile['profiler'].disable()
+            profile['remaining'] -= 1
+            if profile['remaining'] <= 0:
+                self._finish_profile(profile)
+
+    def _finish_profile(self, profile, limit=50):
+        output = io.StringIO()
+        pstats.Stats(profile['profiler'], stream=output).sort_stats('cumulative').print_stats(limit)
+        with self._lock:
+            self._profile = None
+            self._profile_result = {
+                'ticks': profile['ticks'],
+                'started': profile['started'],
+                'finished': time.time(),
+                'report': output.getvalue()
+            }
+        logger.info(f"Profile of {profile['ticks']} tick(s) finished")
+
+    def profile_status(self):
+        """Running capture progress or the latest finished report."""
+        with self._lock:
+            profile = self._profile
+            if profile is not None:
+                return {'status': 'running', 'ticks': profile['ticks'],
+                        'remaining': profile['remaining'], 'started': profile['started']}
+            if self._profile_result is not None:
+                return dict(self._profile_result, status='finished')
+            return {'status': 'idle'}
+
+
+registry = PerfRegistry()
+timed = registry.timed
+timed_function = registry.timed_function
@@ -0,0 +1,459 @@
+import re
+import ast
+import time
+import logging
+import operator
+from collections import deque
+
+from alert_rules import AlertRule, EVENT_RENOTIFY, EVENT_RESOLVED
+from history import DURATION_UNITS
+from monitor import NET_COUNTERS, COUNTER_SERIES_SUFFIX
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Size suffixes accepted in expressions (binary, like the dashboard)
+SIZE_UNITS = {
+    'B': 1,
+    'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4,
+    'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3, 'TiB': 1024 ** 4
+}
+
+# Window aggregates: func(series, duration)
+WINDOW_FUNCTIONS = ('avg', 'min', 'max', 'sum', 'count', 'delta', 'rate')
+
+# Root name of per-process lookups such as proc['postgres'].rss, and the
+# fields they expose
+PROCESS_ROOT = 'proc'
+PROCESS_FIELDS = ('rss', 'cpu', 'memory_percent', 'count')
+
+# String literals are matched first so units are never rewritten inside them
+_LITERAL_PATTERN = re.compile(
+    r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")"""
+    r"|(?<![\w.])(\d+(?:\.\d+)?)(" + '|'.join(sorted(list(SIZE_UNITS) + list(DURATION_UNITS), key=len, reverse=True)) + r")\b"
+)
+
+# History series that already hold per-second rates
+_RATE_SERIES_PATTERN = re.compile(r'^(?:net(?:\[[^\]]*\])?|diskio\[[^\]]*\])\.\w+$')
+
+_COMPARISONS = {
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne
+}
+
+_ARITHMETIC = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv
+}
+
+
+class RunningWindow:
+    """
+    Sliding time window over one series with O(1) amortized updates.
+    Keeps a running sum, monotonic deques for min/max and the running
+    counter increase (ignoring resets) for rate().
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._samples = deque()  # (timestamp, value, increase since previous sample)
+        self._mins = deque()
+        self._maxs = deque()
+        self._sum = 0.0
+        self._increase = 0.0  # sum of increases after the oldest sample
+
+    def add(self, timestamp, value):
+        if self._samples:
+            last_timestamp, last_value, _ = self._samples[-1]
+            if timestamp <= last_timestamp:
+                return
+            # A counter that went down has been reset; count from zero
+            increase = value - last_value if value >= last_value else value
+            self._increase += increase
+        else:
+            increase = 0.0
+        self._samples.append((timestamp, value, increase))
+        self._sum += value
+        while self._mins and self._mins[-1][1] > value:
+            self._mins.pop()
+        self._mins.append((timestamp, value))
+        while self._maxs and self._maxs[-1][1] < value:
+            self._maxs.pop()
+        self._maxs.append((timestamp, value))
+        self.expire(timestamp)
+
+    def expire(self, now):
+        """Drop samples older than the window as of `now`."""
+        cutoff = now - self.seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            _, value, _ = self._samples.popleft()
+            self._sum -= value
+            if self._samples:
+                # The next sample becomes the oldest; its increase no longer counts
+                self._increase -= self._samples[0][2]
+            else:
+                self._increase = 0.0
+        while self._mins and self._mins[0][0] < cutoff:
+            self._mins.popleft()
+        while self._maxs and self._maxs[0][0] < cutoff:
+            self._maxs.popleft()
+
+    def value(self, function):
+        """Current value of a window function, or None without samples."""
+        samples = self._samples
+        if function == 'count':
+            return len(samples)
+        if not samples:
+            return None
+        if function == 'avg':
+            return self._sum / len(samples)
+        if function == 'sum':
+            return self._sum
+        if function == 'min':
+            return self._mins[0][1]
+        if function == 'max':
+            return self._maxs[0][1]
+        if function == 'delta':
+            return samples[-1][1] - samples[0][1]
+        # rate: per-second counter increase
+        elapsed = samples[-1][0] - samples[0][0]
+        return self._increase / elapsed if elapsed > 0 else None
+
+
+class _Context:
+    """Values visible to compiled expressions during one evaluation."""
+
+    def __init__(self, engine, values, processes):
+        self.engine = engine
+        self.values = values
+        self._processes = processes
+        self._process_totals = None
+
+    def series(self, name):
+        value = self.values.get(name)
+        if value is None and self.engine.store is not None:
+            value = self.engine.store.latest(name)
+        return value
+
+    def process(self, name, field):
+        if self._process_totals is None:
+            self._process_totals = self._processes() if self._processes else {}
+        totals = self._process_totals.get(name)
+        if totals is None:
+            return 0 if field == 'count' else None
+        return totals[field]
+
+
+def _expand_units(expression):
+    """Rewrite literals such as 5m and 8GB as plain numbers."""
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        number, unit = float(match.group(2)), match.group(3)
+        return repr(number * (SIZE_UNITS[unit] if unit in SIZE_UNITS else DURATION_UNITS[unit]))
+    return _LITERAL_PATTERN.sub(replace, expression)
+
+
+def _constant(node):
+    """Value of a numeric or string constant node (including negative numbers)."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _constant(node.operand)
+        if isinstance(value, (int, float)):
+            return -value
+    raise ValueError(f"Expected a constant, got {ast.unparse(node)!r}")
+
+
+def series_name(node):
+    """
+    Series name for a reference node: cpu, net.errin, cpu.core[0] or
+    disk['/data'].percent (stored as disk[/data].percent).
+    """
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return f"{series_name(node.value)}.{node.attr}"
+    if isinstance(node, ast.Subscript):
+        return f"{series_name(node.value)}[{_constant(node.slice)}]"
+    raise ValueError(f"Expected a metric name, got {ast.unparse(node)!r}")
+
+
+class _Compiler:
+    """Turns an expression AST into nested closures taking a _Context."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.windows = set()
+
+    def compile(self, node):
+        if isinstance(node, ast.Expression):
+            return self.compile(node.body)
+        if isinstance(node, ast.BoolOp):
+            return self._bool(node)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self.compile(node.operand)
+            return lambda ctx: not operand(ctx)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = self.compile(node.operand)
+            return lambda ctx: _negate(operand(ctx))
+        if isinstance(node, ast.Compare):
+            return self.comparison(node)[1]
+        if isinstance(node, ast.BinOp):
+            return self._arithmetic(node)
+        if isinstance(node, ast.Call):
+            return self._call(node)
+        if isinstance(node, ast.Constant):
+            value = _constant(node)
+            if isinstance(value, str):
+                raise ValueError(f"Unexpected string {value!r}")
+            return lambda ctx: value
+        if self._is_process(node):
+            return self._process(node)
+        if isinstance(node, (ast.Name, ast.Attribute, ast.Subscript)):
+            name = series_name(node)
+            return lambda ctx: ctx.series(name)
+        raise ValueError(f"Unsupported expression: {ast.unparse(node)!r}")
+
+    def _bool(self, node):
+        operands = [self.compile(value) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda ctx: all(operand(ctx) for operand in operands)
+        return lambda ctx: any(operand(ctx) for operand in operands)
+
+    def comparison(self, node):
+        """Return (left, condition) closures for a (chained) comparison."""
+        left = self.compile(node.left)
+        steps = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARISONS:
+                raise ValueError(f"Unsupported comparison in {ast.unparse(node)!r}")
+            steps.append((_COMPARISONS[type(op)], self.compile(comparator)))
+
+        def condition(ctx):
+            current = left(ctx)
+            for compare, right in steps:
+                other = right(ctx)
+                if current is None or other is None or not compare(current, other):
+                    return False
+                current = other
+            return True
+        return left, condition
+
+    def _arithmetic(self, node):
+        if type(node.op) not in _ARITHMETIC:
+            raise ValueError(f"Unsupported operator in {ast.unparse(node)!r}")
+        apply = _ARITHMETIC[type(node.op)]
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+
+        def evaluate(ctx):
+            a, b = left(ctx), right(ctx)
+            if a is None or b is None:
+                return None
+            try:
+                return apply(a, b)
+            except ZeroDivisionError:
+                return None
+        return evaluate
+
+    def _call(self, node):
+        function = node.func.id if isinstance(node.func, ast.Name) else None
+        if function not in WINDOW_FUNCTIONS:
+            raise ValueError(f"Unknown function in {ast.unparse(node)!r}; expected one of {', '.join(WINDOW_FUNCTIONS)}")
+        if len(node.args) != 2 or node.keywords:
+            raise ValueError(f"{function}() takes a metric and a duration, e.g. {function}(cpu, 5m)")
+        name = series_name(node.args[0])
+        seconds = _constant(node.args[1])
+        if not isinstance(seconds, (int, float)) or seconds <= 0:
+            raise ValueError(f"Invalid window in {ast.unparse(node)!r}")
+        if function == 'rate':
+            name = _counter_series(name)
+        key = (name, float(seconds))
+        self.windows.add(key)
+        engine = self.engine
+        return lambda ctx: engine.windows[key].value(function)
+
+    def _is_process(self, node):
+        base = node.value if isinstance(node, ast.Attribute) else None
+        return (isinstance(base, ast.Subscript) and isinstance(base.value, ast.Name)
+                and base.value.id == PROCESS_ROOT)
+
+    def _process(self, node):
+        name = _constant(node.value.slice)
+        field = node.attr
+        if field not in PROCESS_FIELDS:
+            raise ValueError(f"Unknown process field {field!r}; expected one of {', '.join(PROCESS_FIELDS)}")
+        return lambda ctx: ctx.process(name, field)
+
+
+def _counter_series(name):
+    """
+    Series for rate(): the cumulative counter behind net.<counter>. Other
+    series that are already rates are rejected, since rate() of a rate is
+    meaningless.
+    """
+    if name.startswith('net.') and name[len('net.'):] in NET_COUNTERS:
+        return name + COUNTER_SERIES_SUFFIX
+    if _RATE_SERIES_PATTERN.match(name):
+        raise ValueError(f"{name} is already a per-second rate; use avg({name}, ...) instead of rate()")
+    return name
+
+
+def _negate(value):
+    return -value if value is not None else None
+
+
+def parse_expression(expression):
+    """Parse an expression (with unit literals) into an AST, raising ValueError."""
+    try:
+        return ast.parse(_expand_units(expression.strip()), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression {expression!r}: {e.msg}") from None
+
+
+class ExpressionRule(AlertRule):
+    """
+    Alert rule whose condition is an expression such as avg(cpu, 5m) > 90.
+    Uses the AlertRule state machine; the rule resolves once the expression
+    is false. When the expression is a comparison, its left-hand side is
+    reported as the rule's value.
+    """
+
+    def __init__(self, name, expression, value, condition, windows, for_seconds=0,
+                 renotify_interval=0, notify_resolved=True):
+        super().__init__(name, name, 0, None, for_seconds, renotify_interval, notify_resolved, unit='')
+        self.expression = expression
+        self._value = value
+        self._condition = condition
+        self.windows = windows
+
+    def evaluate(self, context, now=None):
+        """Evaluate against a context; returns a notification event or None."""
+        try:
+            breached = bool(self._condition(context))
+            self.value = self._value(context) if self._value is not None else breached
+        except Exception:
+            logger.exception(f"Error evaluating alert rule {self.name!r}")
+            return None
+        return self.transition(breached, not breached, now)
+
+    def notification(self, event):
+        value = self.value
+        if isinstance(value, float):
+            value = round(value, 2)
+        if event == EVENT_RESOLVED:
+            return f"{self.name} Resolved", f"{self.expression} is no longer true (value: {value})"
+        title = f"Alert: {self.name}"
+        message = f"{self.expression} is true (value: {value})"
+        if event == EVENT_RENOTIFY:
+            minutes = int((self.last_notified - self.since) // 60)
+            title += " (still firing)"
+            message += f", firing for {minutes} minutes"
+        return title, message
+
+    def as_dict(self):
+        return dict(super().as_dict(), expression=self.expression, threshold=None, clear_threshold=None)
+
+
+class RuleEngine:
+    """
+    Compiles expression rules once and evaluates them every tick.
+    Window functions share one RunningWindow per (series, duration), fed
+    with each tick's samples, so the cost per tick grows with the number of
+    distinct windows rather than with their length or the number of rules.
+    New windows are backfilled from the history store.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.rules = {}    # name -> ExpressionRule
+        self.windows = {}  # (series, seconds) -> RunningWindow
+
+    def compile(self, name, expression, for_seconds=0, renotify_interval=0, notify_resolved=True):
+        """Compile an expression into an ExpressionRule (raises ValueError)."""
+        tree = parse_expression(expression)
+        compiler = _Compiler(self)
+        if isinstance(tree.body, ast.Compare):
+            value, condition = compiler.comparison(tree.body)
+        else:
+            value, condition = None, compiler.compile(tree)
+        return ExpressionRule(name, expression, value, condition, compiler.windows,
+                              for_seconds, renotify_interval, notify_resolved)
+
+    def configure(self, definitions, defaults=None):
+        """
+        Replace the rule set with definitions ({'name', 'expr'} plus optional
+        'for_seconds', 'renotify_interval', 'notify_resolved'); unchanged rules
+        keep their state. Invalid rules are logged and skipped.
+        Returns the list of (definition, error) that failed to compile.
+        """
+        defaults = defaults or {}
+        rules = {}
+        errors = []
+        for definition in definitions:
+            expression = definition.get('expr', '')
+            name = definition.get('name') or expression
+            options = (
+                definition.get('for_seconds', defaults.get('alert_for_seconds', 0)),
+                definition.get('renotify_interval', defaults.get('alert_renotify_interval', 0)),
+                definition.get('notify_resolved', defaults.get('alert_notify_resolved', True))
+            )
+            existing = self.rules.get(name)
+            if existing is not None and existing.expression == expression:
+                existing.configure(0, None, *options)
+                rules[name] = existing
+                continue
+            try:
+                rules[name] = self.compile(name, expression, *options)
+            except ValueError as e:
+                logger.error(f"Skipping alert rule {name!r}: {str(e)}")
+                errors.append((definition, str(e)))
+        self.rules = rules
+
+        # Keep the windows still referenced, backfilling new ones from history
+        needed = set().union(*(rule.windows for rule in rules.values())) if rules else set()
+        self.windows = {key: self.windows.get(key) or self._backfill(*key) for key in needed}
+        return errors
+
+    def _backfill(self, name, seconds):
+        window = RunningWindow(seconds)
+        if self.store is not None:
+            now = time.time()
+            timestamps, values = self.store.range(name, now - seconds, now + 1)
+            for timestamp, value in zip(timestamps, values):
+                window.add(timestamp, value)
+        return window
+
+    def observe(self, values, timestamp):
+        """Feed one tick of samples to the running windows."""
+        for (name, _), window in self.windows.items():
+            value = values.get(name)
+            if value is not None:
+                window.add(timestamp, float(value))
+
+    def evaluate(self, values, timestamp, processes=None):
+        """
+        Feed one tick of samples and evaluate every rule.
+        processes is an optional callable returning per-name process totals.
+        Returns a list of (rule, event) for due notifications.
+        """
+        self.observe(values, timestamp)
+        context = _Context(self, values, processes)
+        events = []
+        for rule in self.rules.values():
+            event = rule.evaluate(context, timestamp)
+            if event is not None:
+                events.append((rule, event))
+        return events
+
+    def reset(self):
+        """Return every rule to OK without notifying."""
+        for rule in self.rules.values():
+            rule.reset()
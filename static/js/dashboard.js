@@ -1,11 +1,14 @@
 // Initialize Socket.IO connection
 const socket = io();
 
-// Store previous network values to calculate rates
-let prevNetworkData = {
-    bytes_sent: 0,
-    bytes_recv: 0,
-    timestamp: Date.now()
+// Latest full dashboard state and the sequence number it corresponds to
+let dashboardState = null;
+let dashboardSeq = 0;
+
+// Field identifying a row in keyed tables of the payload
+const ROW_KEYS = {
+    processes: 'pid',
+    disk_info: 'mountpoint'
 };
 
 // Initialize charts and gauge objects
@@ -33,12 +36,72 @@ socket.on('connect', function() {
 
 socket.on('disconnect', function() {
     console.log('Disconnected from server');
+    
+    // A full snapshot is sent again on reconnect
+    dashboardState = null;
 });
 
+// Full snapshot, sent on connect or on request
 socket.on('system_metrics', function(data) {
-    updateDashboard(data);
+    dashboardState = data;
+    dashboardSeq = data.seq;
+    updateDashboard(dashboardState);
+});
+
+// Changes since the previous tick
+socket.on('system_metrics_delta', function(delta) {
+    // Wait for the full snapshot sent on connect
+    if (!dashboardState || delta.seq <= dashboardSeq) return;
+    
+    if (delta.seq !== dashboardSeq + 1) {
+        // Missed an update; ask for a fresh full snapshot
+        socket.emit('request_full_snapshot');
+        return;
+    }
+    
+    applyDelta(dashboardState, delta);
+    dashboardSeq = delta.seq;
+    updateDashboard(dashboardState);
 });
 
+// Apply a delta to the dashboard state in place
+function applyDelta(state, delta) {
+    Object.assign(state, delta.set);
+    (delta.unset || []).forEach(key => delete state[key]);
+    
+    Object.entries(delta.rows).forEach(([key, patch]) => {
+        state[key] = applyRowPatch(state[key] || [], patch, ROW_KEYS[key]);
+    });
+    
+    if (delta.history) {
+        if (delta.history.replace) {
+            state.historical = delta.history.replace;
+        } else {
+            state.historical = appendHistory(state.historical, delta.history.append, delta.history.max_points);
+        }
+    }
+}
+
+// Apply upserted rows and the new row order to a keyed table
+function applyRowPatch(rows, patch, keyField) {
+    const byKey = new Map(rows.map(row => [row[keyField], row]));
+    patch.upsert.forEach(row => byKey.set(row[keyField], row));
+    return patch.order.map(key => byKey.get(key));
+}
+
+// Append new points to every list of a (nested) history section
+function appendHistory(section, added, maxPoints) {
+    if (Array.isArray(added)) {
+        return (section || []).concat(added).slice(-maxPoints);
+    }
+    
+    const result = {};
+    Object.keys(added).forEach(key => {
+        result[key] = appendHistory((section || {})[key], added[key], maxPoints);
+    });
+    return result;
+}
+
 // Function to update all dashboard elements with new data
 function updateDashboard(data) {
     // Update CPU metrics
@@ -185,47 +248,14 @@ function updateDiskInfoTable(diskInfo) {
 
 // Network metrics update
 function updateNetworkMetrics(network) {
-    // Calculate rates
-    const now = Date.now();
-    const timeDiff = (now - prevNetworkData.timestamp) / 1000; // seconds
-    
-    let uploadRate = 0;
-    let downloadRate = 0;
-    
-    if (prevNetworkData.bytes_sent > 0 && timeDiff > 0) {
-        uploadRate = (network.bytes_sent - prevNetworkData.bytes_sent) / timeDiff / 1024; // KB/s
-        downloadRate = (network.bytes_recv - prevNetworkData.bytes_recv) / timeDiff / 1024; // KB/s
-    }
+    // Rates are computed on the server in bytes per second
+    const rates = network.rates || {};
+    const uploadRate = (rates.bytes_sent || 0) / 1024; // KB/s
+    const downloadRate = (rates.bytes_recv || 0) / 1024; // KB/s
     
     // Update text values
     document.getElementById('network-upload').textContent = `${uploadRate.toFixed(2)} KB/s`;
     document.getElementById('network-download').textContent = `${downloadRate.toFixed(2)} KB/s`;
-    
-    // Update stored values for next calculation
-    prevNetworkData = {
-        bytes_sent: network.bytes_sent,
-        bytes_recv: network.bytes_recv,
-        timestamp: now
-    };
-    
-    // Update network chart if available
-    if (networkChart) {
-        networkChart.data.datasets[0].data.push(uploadRate);
-        networkChart.data.datasets[1].data.push(downloadRate);
-        
-        // Keep only last 30 data points
-        if (networkChart.data.datasets[0].data.length > 30) {
-            networkChart.data.datasets[0].data.shift();
-            networkChart.data.datasets[1].data.shift();
-            networkChart.data.labels.shift();
-        }
-        
-        // Add new timestamp
-        const time = new Date().toLocaleTimeString();
-        networkChart.data.labels.push(time);
-        
-        networkChart.update();
-    }
 }
 
 // Update system logs table
@@ -319,6 +349,14 @@ function updateCharts(historicalData) {
         memoryChart.data.datasets[0].data = historicalData.memory;
         memoryChart.update();
     }
+    
+    // Update network chart (KB/s)
+    if (networkChart && historicalData && historicalData.timestamps && historicalData.network) {
+        networkChart.data.labels = historicalData.timestamps;
+        networkChart.data.datasets[0].data = historicalData.network.sent;
+        networkChart.data.datasets[1].data = historicalData.network.received;
+        networkChart.update();
+    }
 }
 
 // Update cache information
@@ -414,6 +452,7 @@ function setupCacheCleanup() {
     const cleanCacheBtn = document.getElementById('cleanCacheBtn');
     const cacheInfoDiv = document.getElementById('cacheInfo');
     const cleaningProgressDiv = document.getElementById('cleaningProgress');
+    const cleaningProgressText = document.getElementById('cleaningProgressText');
     const cleaningResultsDiv = document.getElementById('cleaningResults');
     const cleanupResultMessage = document.getElementById('cleanupResultMessage');
     const backToCacheInfoBtn = document.getElementById('backToCacheInfoBtn');
@@ -424,6 +463,52 @@ function setupCacheCleanup() {
     // Initialize toast
     const toast = new bootstrap.Toast(statusToast);
     
+    // ID of the cleanup job started from this page
+    let cleanupJobId = null;
+    
+    // Stream progress of the running cleanup job
+    socket.on('cache_cleanup_progress', function(progress) {
+        if (progress.job_id !== cleanupJobId || !cleaningProgressText) return;
+        
+        const freedMb = (progress.bytes_freed / (1024 * 1024)).toFixed(2);
+        cleaningProgressText.textContent = `Removed ${progress.files_removed} files, freed ${freedMb} MB...`;
+        cleaningProgressText.title = progress.current_path || '';
+    });
+    
+    socket.on('cache_cleanup_complete', function(data) {
+        if (data.job_id !== cleanupJobId) return;
+        cleanupJobId = null;
+        
+        // Hide progress indicator
+        cleaningProgressDiv.classList.add('d-none');
+        if (cleaningProgressText) {
+            cleaningProgressText.textContent = 'Cleaning cache and temporary files...';
+        }
+        
+        if (data.cache_info) {
+            updateCacheInfo(data.cache_info);
+        }
+        
+        if (data.status === 'completed') {
+            // Show success message
+            cleanupResultMessage.textContent = data.message;
+            cleaningResultsDiv.classList.remove('d-none');
+            
+            // Update toast for success
+            toastTitle.textContent = 'Cleanup Complete';
+            toastMessage.textContent = data.message;
+            toast.show();
+        } else {
+            // Show error message
+            cacheInfoDiv.classList.remove('d-none');
+            
+            // Show error toast
+            toastTitle.textContent = 'Cleanup Failed';
+            toastMessage.textContent = data.message || 'An error occurred during cleanup';
+            toast.show();
+        }
+    });
+    
     if (cleanCacheBtn) {
         cleanCacheBtn.addEventListener('click', function() {
             // Show cleaning in progress
@@ -431,7 +516,7 @@ function setupCacheCleanup() {
             cleaningProgressDiv.classList.remove('d-none');
             cleaningResultsDiv.classList.add('d-none');
             
-            // Send cleanup request to server
+            // Start a cleanup job on the server; progress arrives over the socket
             fetch('/api/clean_cache', {
                 method: 'POST',
                 headers: {
@@ -441,27 +526,20 @@ function setupCacheCleanup() {
             })
             .then(response => response.json())
             .then(data => {
-                // Hide progress indicator
+                if (data.job_id) {
+                    // A job was started, or one is already running
+                    cleanupJobId = data.job_id;
+                    return;
+                }
+                
+                // Hide progress and show cache info again
                 cleaningProgressDiv.classList.add('d-none');
+                cacheInfoDiv.classList.remove('d-none');
                 
-                if (data.status === 'success') {
-                    // Show success message
-                    cleanupResultMessage.textContent = data.message;
-                    cleaningResultsDiv.classList.remove('d-none');
-                    
-                    // Update toast for success
-                    toastTitle.textContent = 'Cleanup Complete';
-                    toastMessage.textContent = data.message;
-                    toast.show();
-                } else {
-                    // Show error message
-                    cacheInfoDiv.classList.remove('d-none');
-                    
-                    // Show error toast
-                    toastTitle.textContent = 'Cleanup Failed';
-                    toastMessage.textContent = data.message || 'An error occurred during cleanup';
-                    toast.show();
-                }
+                // Show error toast
+                toastTitle.textContent = 'Cleanup Failed';
+                toastMessage.textContent = data.message || 'An error occurred during cleanup';
+                toast.show();
             })
             .catch(error => {
                 console.error('Error cleaning cache:', error);
@@ -0,0 +1,18 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The Flask app with its history in a temporary directory and no scheduler running."""
+    os.environ['HISTORY_DIR'] = str(tmp_path_factory.mktemp('history'))
+    with mock.patch.object(BackgroundScheduler, 'start'):
+        import app
+    yield app
+    app.shutdown_scheduler()
@@ -0,0 +1,216 @@
+import json
+import time
+import socket
+import logging
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import agent
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def server_port():
+    return _free_port()
+
+
+@pytest.fixture
+def start_server(app_module, server_port):
+    """Starts the app's /api/ingest on server_port when called."""
+    servers = []
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    def start():
+        server = make_server('127.0.0.1', server_port, app_module.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def make_agent(server_port, tmp_path, monkeypatch):
+    monkeypatch.setattr(agent, 'RETRY_BASE_DELAY', 0.05)
+    monkeypatch.setattr(agent, 'RETRY_MAX_DELAY', 0.2)
+    agents = []
+
+    def make(host, **kwargs):
+        kwargs.setdefault('batch_size', 2)
+        pushing = agent.Agent(f'http://127.0.0.1:{server_port}', host=host,
+                              spool=agent.Spool(str(tmp_path / 'spool')), **kwargs)
+        agents.append(pushing)
+        return pushing
+    yield make
+    for pushing in agents:
+        pushing.stop(timeout=1)
+
+
+def _samples(count, start=1700000000.0):
+    return [(start + index * 10, {'cpu': float(index), 'memory': 50.0}) for index in range(count)]
+
+
+def test_batches_are_spooled_while_the_server_is_down_and_replayed_in_order(app_module, start_server, make_agent):
+    pushing = make_agent('spool-host', max_pending=1)
+    pushing.start()
+    samples = _samples(10)
+    for timestamp, values in samples:
+        pushing.add_sample(timestamp, values)
+
+    # Nothing is listening: every batch ends up on disk
+    assert _wait_for(lambda: len(pushing.spool) == 5 and pushing._pending.empty())
+
+    start_server()
+    assert _wait_for(lambda: len(pushing.spool) == 0)
+    assert _wait_for(lambda: app_module.remote_hosts.get('spool-host', {}).get('last_timestamp') == samples[-1][0])
+
+    timestamps, values = app_module.remote_hosts['spool-host']['history'].window('cpu')
+    assert list(timestamps) == [timestamp for timestamp, _ in samples]
+    assert list(values) == [sample['cpu'] for _, sample in samples]
+
+
+def test_spooled_batches_survive_a_restart(app_module, start_server, make_agent):
+    first = make_agent('restart-host')
+    for timestamp, values in _samples(4):
+        first.add_sample(timestamp, values)
+    # Stopping without a reachable server leaves the batches in the spool
+    first.stop(timeout=1)
+    assert len(first.spool) == 2
+
+    start_server()
+    second = make_agent('restart-host')
+    second.start()
+    assert _wait_for(lambda: len(second.spool) == 0)
+    assert app_module.remote_hosts['restart-host']['history'].count('cpu') == 4
+
+
+def test_ingest_rejects_non_finite_and_future_samples(app_module):
+    client = app_module.app.test_client()
+    now = time.time()
+    response = client.post('/api/ingest', json={'host': 'bad-host', 'samples': [
+        ['inf', {'cpu': 1.0}],
+        [now + 86400, {'cpu': 1.0}],
+        [now - 20, {'cpu': 'nan'}],
+        [now - 10, {'cpu': 2.0}]
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()['rejected'] == 3
+    assert response.get_json()['accepted'] == 1
+
+    # A later sample is still accepted
+    response = client.post('/api/ingest', json={'host': 'bad-host', 'samples': [[now, {'cpu': 3.0}]]})
+    assert response.get_json()['accepted'] == 1
+
+
+def test_new_hosts_beyond_the_cap_are_refused_until_silent_hosts_are_evicted(app_module, monkeypatch):
+    client = app_module.app.test_client()
+    monkeypatch.setattr(app_module, 'MAX_REMOTE_HOSTS', len(app_module.remote_hosts) + 1)
+    assert client.post('/api/ingest', json={'host': 'cap-1', 'samples': [[time.time(), {'cpu': 1.0}]]}).status_code == 200
+
+    response = client.post('/api/ingest', json={'host': 'cap-2', 'samples': [[time.time(), {'cpu': 1.0}]]})
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+
+    app_module.remote_hosts['cap-1']['last_seen'] -= app_module.REMOTE_HOST_TTL + 1
+    app_module.evict_silent_hosts()
+    assert 'cap-1' not in app_module.remote_hosts
+    assert client.post('/api/ingest', json={'host': 'cap-2', 'samples': [[time.time(), {'cpu': 1.0}]]}).status_code == 200
+
+
+def test_ingest_rejects_invalid_series_names(app_module):
+    client = app_module.app.test_client()
+    response = client.post('/api/ingest', json={'host': 'names-host', 'samples': [
+        [time.time(), {'cpu': 1.0, 'cpu\n<script>': 2.0}]
+    ]})
+    assert response.status_code == 400
+    assert 'names-host' not in app_module.remote_hosts
+
+
+def test_batches_adding_series_past_the_per_host_cap_are_refused(app_module, monkeypatch):
+    client = app_module.app.test_client()
+    monkeypatch.setattr(app_module, 'MAX_SERIES_PER_HOST', 3)
+    now = time.time()
+
+    response = client.post('/api/ingest', json={'host': 'series-host', 'samples': [
+        [now - 20, {f'series[{index}].value': 1.0 for index in range(4)}]
+    ]})
+    assert response.status_code == 413
+    assert 'series-host' not in app_module.remote_hosts
+
+    assert client.post('/api/ingest', json={'host': 'series-host', 'samples': [
+        [now - 20, {'cpu': 1.0, 'memory': 2.0}]
+    ]}).status_code == 200
+    response = client.post('/api/ingest', json={'host': 'series-host', 'samples': [
+        [now - 10, {'cpu': 1.0, 'disk': 3.0, 'net.bytes_sent': 4.0}]
+    ]})
+    assert response.status_code == 413
+    assert app_module.remote_hosts['series-host']['history'].names() == ['cpu', 'memory']
+
+    # Known series are still accepted
+    assert client.post('/api/ingest', json={'host': 'series-host', 'samples': [
+        [now, {'cpu': 1.0, 'memory': 2.0}]
+    ]}).get_json()['accepted'] == 1
+
+
+def test_batches_refused_for_a_wrong_token_stay_in_the_spool(app_module, start_server, make_agent, monkeypatch):
+    monkeypatch.setattr(app_module, 'INGEST_TOKEN', 'rotated')
+    start_server()
+    pushing = make_agent('token-host')
+    pushing.start()
+    for timestamp, values in _samples(4):
+        pushing.add_sample(timestamp, values)
+    assert _wait_for(lambda: len(pushing.spool) == 2)
+    assert 'token-host' not in app_module.remote_hosts
+
+    # Once the server accepts the agent again, nothing has been lost
+    monkeypatch.setattr(app_module, 'INGEST_TOKEN', None)
+    assert _wait_for(lambda: len(pushing.spool) == 0)
+    assert app_module.remote_hosts['token-host']['history'].count('cpu') == 4
+
+
+def test_batches_refused_as_too_large_are_split_and_resent(app_module, start_server, make_agent, monkeypatch):
+    start_server()
+    pushing = make_agent('split-host', batch_size=8)
+    samples = [(timestamp, dict(values, **{f'extra[{index}].value': float(index * timestamp) for index in range(20)}))
+               for timestamp, values in _samples(8)]
+    # Room for about two samples per batch (the limit applies after decompression)
+    monkeypatch.setattr(app_module, 'MAX_INGEST_BYTES', len(json.dumps(
+        {'host': 'split-host', 'samples': [list(sample) for sample in samples[:2]]})) + 64)
+    pushing.start()
+    for timestamp, values in samples:
+        pushing.add_sample(timestamp, values)
+
+    assert _wait_for(lambda: app_module.remote_hosts.get('split-host', {}).get('last_timestamp') == samples[-1][0])
+    timestamps, _ = app_module.remote_hosts['split-host']['history'].window('cpu')
+    assert list(timestamps) == [timestamp for timestamp, _ in samples]
+
+
+def test_invalid_batches_are_dropped(app_module, start_server, make_agent):
+    start_server()
+    pushing = make_agent('invalid-host')
+    pushing.start()
+    pushing.add_sample(time.time() - 10, {'cpu': 1.0, 'not a series!': 2.0})
+    pushing.add_sample(time.time() - 5, {'cpu': 1.0})
+    pushing.add_sample(time.time() - 2, {'cpu': 1.0})
+    pushing.add_sample(time.time(), {'cpu': 2.0})
+
+    # The first batch is refused with 400 and dropped; the second one arrives
+    assert _wait_for(lambda: 'invalid-host' in app_module.remote_hosts)
+    assert app_module.remote_hosts['invalid-host']['history'].count('cpu') == 2
+    assert len(pushing.spool) == 0
@@ -0,0 +1,123 @@
+import socket
+import threading
+from email.mime.text import MIMEText
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pytest
+
+import alert
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class RecordingHandler:
+    """aiosmtpd handler that remembers the connection each message came in on."""
+
+    def __init__(self):
+        self.peers = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.peers.append(session.peer)
+        return '250 OK'
+
+
+@pytest.fixture
+def smtp_server():
+    """Plain local SMTP relay (aiosmtpd) and an email config pointing at it."""
+    controller_module = pytest.importorskip('aiosmtpd.controller')
+    handler = RecordingHandler()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    yield handler, {
+        'email_from': 'monitor@example.com',
+        'email_to': 'admin@example.com',
+        'smtp_server': '127.0.0.1',
+        'smtp_port': controller.port,
+        'smtp_username': '',
+        'smtp_password': '',
+        'smtp_starttls': False
+    }
+    controller.stop()
+
+
+def _message(number):
+    msg = MIMEText(f"alert {number}")
+    msg['From'] = 'monitor@example.com'
+    msg['To'] = 'admin@example.com'
+    msg['Subject'] = f"Alert {number}"
+    return msg
+
+
+def test_smtp_connection_is_reused_across_alerts(smtp_server):
+    handler, config = smtp_server
+    channel = alert.SMTPChannel()
+    try:
+        for number in range(3):
+            channel.send(_message(number), config)
+    finally:
+        channel.close()
+    assert len(handler.peers) == 3
+    assert len(set(handler.peers)) == 1
+
+
+def test_smtp_reconnects_after_a_failed_noop(smtp_server):
+    handler, config = smtp_server
+    channel = alert.SMTPChannel()
+    try:
+        channel.send(_message(1), config)
+        with mock.patch.object(channel._server, 'noop', return_value=(421, b'closing')):
+            channel.send(_message(2), config)
+        channel.send(_message(3), config)
+    finally:
+        channel.close()
+    assert len(handler.peers) == 3
+    assert handler.peers[0] != handler.peers[1]
+    assert handler.peers[1] == handler.peers[2]
+
+
+def test_smtp_alert_without_starttls_reaches_a_plain_relay(smtp_server):
+    handler, config = smtp_server
+    assert alert.send_email_alert("Disk almost full", "/ is at 95%", config)
+    assert len(handler.peers) == 1
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 webhook stand-in that answers 204 and records the client port."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.ports.append(self.client_address[1])
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def webhook_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookHandler)
+    server.daemon_threads = True
+    server.ports = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/webhook", server.ports
+    server.shutdown()
+    server.server_close()
+
+
+def test_webhook_connections_are_kept_alive(webhook_server):
+    url, ports = webhook_server
+    channel = alert.WebhookChannel()
+    try:
+        for number in range(3):
+            assert channel.post(url, {'content': f"alert {number}"}).status_code == 204
+    finally:
+        channel.close()
+    assert len(ports) == 3
+    assert len(set(ports)) == 1
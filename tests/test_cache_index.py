@@ -0,0 +1,43 @@
+import os
+from unittest import mock
+
+import cache_index
+from cache_index import CacheIndex, REVALIDATE_SECONDS
+
+
+def _tree(root, directories=60):
+    for index in range(directories):
+        directory = os.path.join(root, f"d{index:02d}")
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'file.tmp'), 'wb') as f:
+            f.write(b'x' * (index + 1))
+    return str(root)
+
+
+def test_revalidation_of_an_unchanged_tree_is_spread_over_several_scans(tmp_path):
+    root = _tree(tmp_path / 'cache')
+    index = CacheIndex(index_file=str(tmp_path / 'index.json'))
+    start = 1700000000.0
+    with mock.patch.object(cache_index.time, 'time', lambda: start):
+        expected = index.scan(root)
+
+    listed = []
+    list_dir = index._list_dir
+
+    def counting_list_dir(path, mtime, now):
+        listed.append(path)
+        return list_dir(path, mtime, now)
+
+    # Rescans every 10 minutes, as the cache_info collector does
+    with mock.patch.object(index, '_list_dir', counting_list_dir):
+        relisted = []
+        for run in range(1, 10):
+            with mock.patch.object(cache_index.time, 'time', lambda: start + run * 600):
+                assert index.scan(root) == expected
+            relisted.append(len(listed))
+            listed.clear()
+
+    directories = 61
+    assert max(relisted) < directories / 2
+    # Still, every directory is re-listed within 1.5 * REVALIDATE_SECONDS
+    assert sum(relisted[:int(1.5 * REVALIDATE_SECONDS / 600)]) >= directories
@@ -0,0 +1,38 @@
+import time
+
+from fleet import FleetIndex
+
+
+def _report(index, host, start, cpu, count=10, step=30):
+    for number in range(count):
+        index.update(host, start + number * step, {'cpu': cpu, 'memory': 50.0})
+
+
+def test_hosts_silent_for_longer_than_the_window_are_left_out():
+    index = FleetIndex()
+    now = time.time()
+    _report(index, 'gone', now - 86400, cpu=99.0)
+    _report(index, 'alive', now - 300, cpu=20.0)
+
+    total, hosts = index.top('cpu', agg='avg', window='15m')
+    assert total == 1
+    assert [host['host'] for host in hosts] == ['alive']
+
+    # 'last' still reports the latest value unless max_age is given
+    total, _ = index.top('cpu')
+    assert total == 2
+    total, _ = index.top('cpu', max_age=900)
+    assert total == 1
+
+
+def test_windows_are_aggregated_as_of_query_time():
+    index = FleetIndex()
+    now = time.time()
+    _report(index, 'host', now - 600, cpu=90.0, count=5)
+    _report(index, 'host', now - 120, cpu=10.0, count=5)
+
+    # Only the samples of the last five minutes count towards the 5m window
+    _, hosts = index.top('cpu', agg='avg', window='5m')
+    assert hosts[0]['value'] == 10.0
+    total, _ = index.top('cpu', agg='avg', window='15m', filters=['avg(cpu, 5m) > 50'])
+    assert total == 0